@@ -0,0 +1,275 @@
+"""
+In-process fake of the parts of the GitHub REST API used by core/github_storage.py
+
+It keeps blobs, trees, commits and branch refs in memory, so the Contents API
+and Git Data API sync paths can be exercised and benchmarked offline:
+
+    with FakeGitHub(latency=0.05) as github:
+        github.configure_env()
+        batch_update_github_files({...})
+        print(github.request_counts)
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def git_blob_sha(content):
+    """SHA-1 of a blob exactly as git computes it"""
+    data = content.encode() if isinstance(content, str) else content
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _object_sha(kind, payload):
+    return hashlib.sha1(f"{kind}\0{json.dumps(payload, sort_keys=True)}".encode()).hexdigest()
+
+
+class FakeGitHub:
+    """
+    Threaded HTTP server emulating one GitHub repository
+
+    Args:
+        repo: "owner/name" of the fake repository
+        branch: Branch created with an empty initial commit
+        latency: Seconds of artificial delay added to every request
+        rate_limit: Value reported by the X-RateLimit-Remaining header
+    """
+
+    def __init__(self, repo="spl/fake", branch="main", latency=0.0, rate_limit=5000):
+        self.repo = repo
+        self.branch = branch
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}
+        self.request_counts = Counter()
+        # Queue of (status, headers) forced onto the next requests, for retry tests
+        self.fail_next = []
+
+        empty_tree = self._put_tree({})
+        self.refs[branch] = self._put_commit(empty_tree, [], "Initial commit")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def configure_env(self, token="fake-token"):
+        """Point core.github_storage at this server through environment variables"""
+        os.environ.update({
+            "SPL_GITHUB_TOKEN": token,
+            "SPL_GITHUB_REPO": self.repo,
+            "SPL_GITHUB_BRANCH": self.branch,
+            "SPL_GITHUB_API_URL": self.url,
+        })
+
+    def reset_counts(self):
+        self.request_counts.clear()
+
+    def read_file(self, path, branch=None):
+        """Current content of a file on a branch, or None"""
+        with self.lock:
+            tree = self.trees[self.commits[self.refs[branch or self.branch]]["tree"]]
+            sha = tree.get(path)
+            return self.blobs[sha].decode() if sha else None
+
+    def commit_count(self, branch=None):
+        with self.lock:
+            count, sha = 0, self.refs[branch or self.branch]
+            while sha:
+                count += 1
+                parents = self.commits[sha]["parents"]
+                sha = parents[0] if parents else None
+            return count
+
+    # Object store
+
+    def _put_blob(self, content):
+        sha = git_blob_sha(content)
+        self.blobs[sha] = content
+        return sha
+
+    def _put_tree(self, entries):
+        sha = _object_sha("tree", entries)
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def _put_commit(self, tree, parents, message):
+        commit = {"tree": tree, "parents": parents, "message": message}
+        sha = _object_sha("commit", {**commit, "n": len(self.commits)})
+        self.commits[sha] = commit
+        return sha
+
+    # Request handling
+
+    def _handle(self, method, path, query, body):
+        prefix = f"/repos/{self.repo}"
+        if not path.startswith(prefix):
+            return 404, {"message": "Not Found"}
+        path = path[len(prefix):]
+
+        if method == "GET" and path == "":
+            return 200, {"full_name": self.repo}
+
+        match = re.fullmatch(r"/contents/(.+)", path)
+        if match:
+            return self._contents(method, match.group(1), query, body)
+
+        match = re.fullmatch(r"/git/refs?/heads/(.+)", path)
+        if match:
+            branch = match.group(1)
+            if branch not in self.refs:
+                return 404, {"message": "Not Found"}
+            if method == "GET":
+                return 200, {"ref": f"refs/heads/{branch}", "object": {"sha": self.refs[branch], "type": "commit"}}
+            if method == "PATCH":
+                new_sha = body["sha"]
+                parents = self.commits.get(new_sha, {}).get("parents", [])
+                if not body.get("force") and self.refs[branch] not in parents:
+                    return 422, {"message": "Update is not a fast forward"}
+                self.refs[branch] = new_sha
+                return 200, {"ref": f"refs/heads/{branch}", "object": {"sha": new_sha, "type": "commit"}}
+
+        match = re.fullmatch(r"/git/commits/(\w+)", path)
+        if match and method == "GET":
+            commit = self.commits.get(match.group(1))
+            if not commit:
+                return 404, {"message": "Not Found"}
+            return 200, {
+                "sha": match.group(1),
+                "tree": {"sha": commit["tree"]},
+                "parents": [{"sha": p} for p in commit["parents"]],
+                "message": commit["message"],
+            }
+
+        if method == "POST" and path == "/git/commits":
+            sha = self._put_commit(body["tree"], body.get("parents", []), body.get("message", ""))
+            return 201, {"sha": sha}
+
+        if method == "POST" and path == "/git/blobs":
+            content = body["content"]
+            data = base64.b64decode(content) if body.get("encoding") == "base64" else content.encode()
+            return 201, {"sha": self._put_blob(data)}
+
+        if method == "POST" and path == "/git/trees":
+            entries = dict(self.trees.get(body.get("base_tree"), {}))
+            for entry in body["tree"]:
+                if "content" in entry:
+                    entries[entry["path"]] = self._put_blob(entry["content"].encode())
+                elif entry.get("sha") is None:
+                    entries.pop(entry["path"], None)
+                else:
+                    entries[entry["path"]] = entry["sha"]
+            sha = self._put_tree(entries)
+            return 201, {"sha": sha, "tree": [{"path": p, "sha": s, "type": "blob"} for p, s in entries.items()]}
+
+        return 404, {"message": "Not Found"}
+
+    def _contents(self, method, file_path, query, body):
+        branch = (body or {}).get("branch") or query.get("ref") or self.branch
+        head = self.refs[branch]
+        tree = self.trees[self.commits[head]["tree"]]
+        current = tree.get(file_path)
+
+        if method == "GET":
+            if not current:
+                return 404, {"message": "Not Found"}
+            return 200, {
+                "path": file_path,
+                "sha": current,
+                "content": base64.b64encode(self.blobs[current]).decode(),
+                "encoding": "base64",
+            }
+
+        if method == "PUT":
+            if current and body.get("sha") != current:
+                if body.get("sha") is None:
+                    return 422, {"message": "\"sha\" wasn't supplied."}
+                return 409, {"message": f"{file_path} does not match {body.get('sha')}"}
+            blob = self._put_blob(base64.b64decode(body["content"]))
+            new_tree = self._put_tree({**tree, file_path: blob})
+            self.refs[branch] = self._put_commit(new_tree, [head], body.get("message", ""))
+            return (200 if current else 201), {"content": {"path": file_path, "sha": blob}}
+
+        return 405, {"message": "Method Not Allowed"}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real API
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self, method):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                path, _, query_string = self.path.partition("?")
+                query = dict(p.split("=", 1) for p in query_string.split("&") if "=" in p)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+
+                with fake.lock:
+                    route = re.sub(r"/[0-9a-f]{40}$", "/:sha", path)
+                    fake.request_counts[f"{method} {route}"] += 1
+                    fake.rate_limit = max(fake.rate_limit - 1, 0)
+                    remaining = fake.rate_limit
+                    if fake.fail_next:
+                        status, extra_headers = fake.fail_next.pop(0)
+                        payload = {"message": "Injected failure"}
+                    else:
+                        status, payload = fake._handle(method, path, query, body)
+                        extra_headers = {}
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("X-RateLimit-Remaining", str(remaining))
+                for name, value in extra_headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,73 @@
+"""
+Compare GitHub sync paths against the local fake server
+
+    python -m bench.github_sync [--latency 0.05] [--rounds 5]
+
+For each round the current data/*.json files are pushed once file-by-file
+through the Contents API (update_json_file) and once as a single commit
+(batch_update_github_files), and the round trips, commits and wall time of
+each path are reported, along with the mean time per API request.
+"""
+import argparse
+import json
+import time
+
+from bench.fake_github import FakeGitHub
+from core.github_storage import batch_update_github_files, get_request_timings, update_json_file
+from core.storage import get_store
+
+
+def _mutate(files_data, round_number):
+    # Touch every file so each round has real changes to push
+    for rows in files_data.values():
+        if rows:
+            rows[0]["_bench_round"] = round_number
+
+
+def _mean_by_request(timings):
+    totals = {}
+    for timing in timings:
+        # Group on the endpoint ("git/trees", "contents/data", ...), dropping the
+        # owner/repo prefix and any file path or SHA after it
+        kind = f"{timing['method']} {'/'.join(timing['path'].split('/')[2:4])}"
+        count, seconds = totals.get(kind, (0, 0.0))
+        totals[kind] = (count + 1, seconds + timing["seconds"])
+    return {kind: seconds / count for kind, (count, seconds) in sorted(totals.items())}
+
+
+def run(latency, rounds):
+    results = {}
+    for name in ("contents_api", "git_data_api"):
+        with FakeGitHub(latency=latency) as github:
+            github.configure_env()
+            elapsed = 0.0
+            first_timing = len(get_request_timings())
+            for round_number in range(rounds):
+                files_data = get_store().files_data()
+                _mutate(files_data, round_number)
+                start = time.perf_counter()
+                if name == "contents_api":
+                    for file_path, data in files_data.items():
+                        update_json_file(file_path, data)
+                else:
+                    batch_update_github_files(files_data)
+                elapsed += time.perf_counter() - start
+            results[name] = {
+                "requests_per_sync": sum(github.request_counts.values()) / rounds,
+                "commits_per_sync": (github.commit_count() - 1) / rounds,
+                "seconds_per_sync": elapsed / rounds,
+                "seconds_by_request": _mean_by_request(get_request_timings()[first_timing:]),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per request")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.latency, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Time verify_ledger end to end on a synthetic league
+
+    python -m bench.ledger [--bets 1000000] [--seed 0] [--repeat 5]
+
+The league is written by bench.synthetic into a temporary directory and
+loaded into a DataStore, which builds the ledger columns along with its
+other indexes. Each timed call is the full check the CLI and admin tools
+run: copying the columns under the store lock, the vectorized replay and
+the per-team report. The synthetic balances are consistent with the
+ledger, so every check must come back OK.
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from bench.synthetic import write
+from core.ledger import verify_ledger
+from core.storage import DataStore, JsonBackend
+
+
+def run(n_bets, seed, repeat):
+    with tempfile.TemporaryDirectory() as data_dir:
+        counts = write(data_dir, n_bets, seed)
+        start = time.perf_counter()
+        store = DataStore(JsonBackend(data_dir))
+        load_seconds = time.perf_counter() - start
+
+    timings = []
+    for _ in range(repeat):
+        report = verify_ledger(store)
+        assert report["ok"], "synthetic ledger doesn't verify"
+        timings.append(report["seconds"])
+
+    return {
+        **counts,
+        "store_load_ms": load_seconds * 1000,
+        "best_ms": min(timings) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bets", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.bets, args.seed, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
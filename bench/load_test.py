@@ -0,0 +1,330 @@
+"""
+Drive the core API from concurrent sessions and check nothing was lost
+
+    python -m bench.load_test [--processes 4] [--threads 4] [--bets 2000] [--settle 3]
+
+A synthetic league (bench.synthetic) is written to a temporary data
+directory, then --processes worker interpreters each run --threads
+threads calling place_bet on upcoming matches, all starting at the same
+moment. The same team bets from several sessions at once, and --duplicates
+of the bets are submitted from two sessions, so at most one of each may be
+accepted. One extra thread in the first process settles --settle other
+upcoming matches with update_result while the bets are coming in. The
+journal compaction threshold is lowered so compactions race with writes
+as well.
+
+Once every worker has exited, a fresh process loads the data directory and
+checks it against what the sessions were told:
+
+    lost_bets          accepted bets that aren't in the data
+    duplicated_bets    (match, team) pairs stored more than once
+    double_accepted    contested bets accepted by both sessions
+    unexpected_bets    stored bets nobody was told were accepted
+    lost_results       accepted results whose match has no winner
+    balance_drift      teams whose balance + stakes != starting balance + winnings
+    negative_balances  teams that spent more than they had
+    outcome_mismatches bets whose status or winnings disagree with the winner
+
+alongside the throughput and p50/p95/p99 latency of each call. The exit
+status is 1 if any check fails, so the harness can gate a concurrency or
+storage change.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECKS = ["lost_bets", "duplicated_bets", "double_accepted", "unexpected_bets", "lost_results",
+          "balance_drift", "negative_balances", "outcome_mismatches"]
+
+
+def _percentiles(seconds):
+    ordered = sorted(seconds)
+    if not ordered:
+        return {"calls": 0}
+    pick = lambda q: ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000
+    return {"calls": len(ordered), "p50_ms": pick(0.5), "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99), "max_ms": ordered[-1] * 1000}
+
+
+def _plan(data_dir, args):
+    """Split bet attempts and results between the worker threads"""
+    from core.storage import DATASETS
+
+    rng = random.Random(args.seed)
+    with open(os.path.join(data_dir, DATASETS["teams"])) as f:
+        teams = json.load(f)
+    with open(os.path.join(data_dir, DATASETS["matches"])) as f:
+        matches = json.load(f)
+    with open(os.path.join(data_dir, DATASETS["bets"])) as f:
+        existing = {(bet["match_id"], bet["team"]) for bet in json.load(f)}
+
+    upcoming = [m for m in matches if not m.get("winner") and m["team1"] and m["team2"]]
+    to_settle, to_bet = upcoming[-args.settle:] if args.settle else [], upcoming[:-args.settle or None]
+
+    attempts = []
+    candidates = [(match, team) for match in to_bet for team in teams
+                  if (match["match_id"], team["team"]) not in existing]
+    for match, team in rng.sample(candidates, min(args.bets, len(candidates))):
+        home = team["home_team"]
+        prediction = home if home in (match["team1"], match["team2"]) else rng.choice([match["team1"], match["team2"]])
+        attempts.append({"team": team["team"], "match_id": match["match_id"],
+                         "prediction": prediction, "amount": rng.randint(1, 4) * 500000})
+
+    slots = [[] for _ in range(args.processes * args.threads)]
+    for i, attempt in enumerate(attempts):
+        slots[i % len(slots)].append(attempt)
+        # Contested bet: the same (match, team) from a different session
+        if len(slots) > 1 and rng.random() < args.duplicates:
+            slots[(i + 1 + rng.randrange(len(slots) - 1)) % len(slots)].append(dict(attempt))
+
+    results = [[m["match_id"], rng.choice([m["team1"], m["team2"]])] for m in to_settle]
+    return [
+        {
+            "threads": slots[p * args.threads:(p + 1) * args.threads],
+            "results": results if p == 0 else [],
+        }
+        for p in range(args.processes)
+    ]
+
+
+def _worker(spec_path, output_path, start_at, settle_interval):
+    from core.betting import place_bet
+    from core.results import update_result
+    from core.storage import get_store
+
+    with open(spec_path) as f:
+        spec = json.load(f)
+    store = get_store()
+    calls = []
+    calls_lock = threading.Lock()
+
+    def call(fn, *args):
+        # An exception is an error for the report, not the end of the session
+        start = time.perf_counter()
+        try:
+            message = fn(*args)
+        except Exception as e:
+            message = f"Error raised: {type(e).__name__}: {e}"
+        return message, time.perf_counter() - start
+
+    def run_bets(attempts):
+        for attempt in attempts:
+            message, seconds = call(place_bet, attempt["team"], attempt["match_id"], attempt["prediction"], attempt["amount"])
+            with calls_lock:
+                calls.append({"call": "place_bet", **attempt, "ok": "successfully" in message,
+                              "message": message, "seconds": seconds})
+
+    def run_results(results):
+        for match_id, winner in results:
+            time.sleep(settle_interval)
+            message, seconds = call(update_result, match_id, winner)
+            with calls_lock:
+                calls.append({"call": "update_result", "match_id": match_id, "winner": winner,
+                              "ok": "updated" in message, "message": message, "seconds": seconds})
+
+    threads = [threading.Thread(target=run_bets, args=(attempts,)) for attempts in spec["threads"]]
+    if spec["results"]:
+        threads.append(threading.Thread(target=run_results, args=(spec["results"],)))
+
+    # Every process starts calling at the same moment
+    time.sleep(max(start_at - time.time(), 0))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    finished_at = time.time()
+
+    # Let a compaction started by the last write finish before exiting
+    while store._compacting:
+        time.sleep(0.01)
+    with open(output_path, "w") as f:
+        json.dump({"calls": calls, "finished_at": finished_at}, f)
+
+
+def _verify(calls_path):
+    """Check the data on disk against the accepted calls; prints the report"""
+    from core.ledger import verify_ledger
+    from core.storage import STARTING_BALANCE, DataStore, create_backend
+
+    store = DataStore(create_backend())
+    with open(calls_path) as f:
+        calls = json.load(f)
+    initial = {tuple(key) for key in calls["initial"]}
+
+    accepted = {}
+    for call in calls["place_bet"]:
+        if call["ok"]:
+            key = (call["match_id"], call["team"])
+            accepted[key] = accepted.get(key, 0) + 1
+
+    stored = {}
+    stakes, winnings = {}, {}
+    for bet in store.bets:
+        key = (bet["match_id"], bet["team"])
+        stored[key] = stored.get(key, 0) + 1
+        stakes[bet["team"]] = stakes.get(bet["team"], 0) + bet["amount"]
+        winnings[bet["team"]] = winnings.get(bet["team"], 0) + bet["winnings"]
+
+    drift = {}
+    for team in store.teams:
+        # Every stake left the balance and every payout came back to it
+        expected = STARTING_BALANCE - stakes.get(team["team"], 0) + winnings.get(team["team"], 0)
+        if team["balance"] != expected:
+            drift[team["team"]] = team["balance"] - expected
+
+    found = {
+        "lost_bets": [list(key) for key in accepted if key not in stored],
+        "duplicated_bets": [list(key) for key, count in stored.items() if count > 1],
+        "double_accepted": [list(key) for key, count in accepted.items() if count > 1],
+        "unexpected_bets": [list(key) for key in stored if key not in initial and key not in accepted],
+        "lost_results": [match_id for match_id, _ in calls["update_result"]
+                         if not (store.get_match(match_id) or {}).get("winner")],
+        "balance_drift": drift,
+        "negative_balances": [team["team"] for team in store.teams if team["balance"] < 0],
+        "outcome_mismatches": verify_ledger(store)["bet_discrepancies"],
+    }
+    print(json.dumps({
+        "bets": len(store.bets),
+        "checks": {name: len(found[name]) for name in CHECKS},
+        "total_drift": sum(abs(d) for d in drift.values()),
+        "examples": {name: (list(found[name].items()) if isinstance(found[name], dict) else found[name])[:5]
+                     for name in CHECKS if found[name]},
+    }))
+
+
+def _child(args, env, cwd):
+    output = subprocess.run([sys.executable, "-m", "bench.load_test", *args],
+                            cwd=cwd, env=env, capture_output=True, text=True)
+    if output.returncode:
+        raise SystemExit(f"{' '.join(args[:1])} failed:\n{output.stderr}")
+    return output.stdout
+
+
+def run(args):
+    """
+    Returns:
+        dict: settings, throughput, latency per call, the baseline and final
+              checks, and "ok" if every final check passed
+    """
+    from bench.synthetic import write
+
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as work_dir:
+        write(data_dir, args.league_bets, args.seed)
+        env = {
+            **os.environ,
+            "SPL_DATA_DIR": data_dir,
+            "SPL_STORAGE_BACKEND": args.backend,
+            "SPL_JOURNAL_COMPACT_BYTES": str(args.compact_bytes),
+            "PYTHONPATH": ROOT,
+            # No GitHub push or Excel backup while the sessions run
+            "SPL_SYNC_INTERVAL": "3600",
+            "SPL_SYNC_MAX_CHANGES": str(10 ** 9),
+        }
+        env.pop("SPL_GITHUB_TOKEN", None)
+        with open(os.path.join(data_dir, "bets.json")) as f:
+            initial = [[bet["match_id"], bet["team"]] for bet in json.load(f)]
+
+        calls_path = os.path.join(work_dir, "calls.json")
+        with open(calls_path, "w") as f:
+            json.dump({"initial": initial, "place_bet": [], "update_result": []}, f)
+        # Also migrates the JSON files first when the backend is SQLite
+        baseline = json.loads(_child(["--verify", calls_path], env, data_dir).strip().splitlines()[-1])
+
+        specs = _plan(data_dir, args)
+        start_at = time.time() + args.warmup
+        workers = []
+        for p, spec in enumerate(specs):
+            spec_path = os.path.join(work_dir, f"spec-{p}.json")
+            with open(spec_path, "w") as f:
+                json.dump(spec, f)
+            workers.append(subprocess.Popen(
+                [sys.executable, "-m", "bench.load_test", "--worker", spec_path,
+                 os.path.join(work_dir, f"calls-{p}.json"), str(start_at), str(args.settle_interval)],
+                cwd=data_dir, env=env, stderr=subprocess.PIPE, text=True,
+            ))
+        for p, worker in enumerate(workers):
+            _, stderr = worker.communicate()
+            if worker.returncode:
+                raise SystemExit(f"Worker {p} failed:\n{stderr}")
+
+        calls, finished_at = [], start_at
+        for p in range(len(specs)):
+            with open(os.path.join(work_dir, f"calls-{p}.json")) as f:
+                output = json.load(f)
+            calls.extend(output["calls"])
+            finished_at = max(finished_at, output["finished_at"])
+
+        with open(calls_path, "w") as f:
+            json.dump({
+                "initial": initial,
+                "place_bet": [c for c in calls if c["call"] == "place_bet"],
+                "update_result": [[c["match_id"], c["winner"]] for c in calls if c["call"] == "update_result" and c["ok"]],
+            }, f)
+        final = json.loads(_child(["--verify", calls_path], env, data_dir).strip().splitlines()[-1])
+
+    elapsed = finished_at - start_at
+    latency, outcomes = {}, {}
+    for name in ("place_bet", "update_result"):
+        made = [c for c in calls if c["call"] == name]
+        latency[name] = _percentiles([c["seconds"] for c in made])
+        outcomes[name] = {
+            "accepted": sum(c["ok"] for c in made),
+            "rejected": sum(not c["ok"] and not c["message"].startswith("Error") for c in made),
+            "errors": sum(c["message"].startswith("Error") for c in made),
+        }
+    return {
+        "settings": {key: value for key, value in vars(args).items() if key not in ("worker", "verify")},
+        "seconds": elapsed,
+        "calls_per_second": len(calls) / elapsed if elapsed else None,
+        "outcomes": outcomes,
+        "latency": latency,
+        "baseline": baseline,
+        "final": final,
+        "ok": not any(final["checks"].values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="sessions per process")
+    parser.add_argument("--bets", type=int, default=2000, help="bet attempts in total")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of bets also sent from another session")
+    parser.add_argument("--settle", type=int, default=3, help="matches settled during the run")
+    parser.add_argument("--settle-interval", type=float, default=0.2, help="seconds between results")
+    parser.add_argument("--league-bets", type=int, default=20000, help="size of the synthetic league")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--compact-bytes", type=int, default=64 * 1024, help="journal compaction threshold")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds for the workers to load before starting")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the JSON report to (default: stdout)")
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    parser.add_argument("--verify", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        spec_path, output_path, start_at, settle_interval = args.worker
+        _worker(spec_path, output_path, float(start_at), float(settle_interval))
+        return
+    if args.verify:
+        _verify(args.verify)
+        return
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure cold-start and rerun latency of the Streamlit pages
+
+    python -m bench.startup [--repeat 3]
+
+Each page is run in a fresh interpreter through Streamlit's AppTest
+harness, against a temporary copy of data/, both on a first start (no
+Excel files yet) and on a restart. Streamlit itself is imported
+before timing starts, so "cold_run" covers the page's own imports, the
+data store load and the first render. "rerun" covers a second render in
+the same process, which is what every widget interaction costs. The heavy
+optional modules each page ends up loading are listed as well.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {"app": "ui/app.py", "admin": "ui/pages/admin.py"}
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "altair", "requests", "core.excel_storage", "core.github_storage"]
+
+
+def _child(page):
+    from streamlit.testing.v1 import AppTest
+
+    baseline = set(sys.modules)
+    app = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=120)
+    app.session_state["authenticated"] = True
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - start
+    if app.exception:
+        raise SystemExit(f"{page} raised: {app.exception[0].message}")
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules and m not in baseline]
+
+    # Let the background daemon finish creating the Excel files before exiting
+    from core.sync_queue import flush_sync
+    flush_sync()
+    print(json.dumps({"cold_run": cold, "rerun": rerun, "loaded": loaded}))
+
+
+def _sample(page, data_dir):
+    env = {**os.environ, "SPL_DATA_DIR": data_dir, "PYTHONPATH": ROOT}
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", page],
+        cwd=data_dir, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summarise(samples):
+    return {
+        "cold_run_seconds": statistics.median(s["cold_run"] for s in samples),
+        "rerun_seconds": statistics.median(s["rerun"] for s in samples),
+        "heavy_modules_loaded": samples[-1]["loaded"],
+    }
+
+
+def run(repeat):
+    """
+    Returns per page:
+        first_start: a fresh data directory, so the Excel files get created
+        restart: a data directory the app has already run against
+    """
+    results = {}
+    for page in PAGES:
+        first_start, restart = [], []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as data_dir:
+                for path in glob.glob(os.path.join(ROOT, "data", "*.json")):
+                    shutil.copy(path, data_dir)
+                first_start.append(_sample(page, data_dir))
+                restart.append(_sample(page, data_dir))
+        results[page] = {"first_start": _summarise(first_start), "restart": _summarise(restart)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=PAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child)
+    else:
+        print(json.dumps(run(args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
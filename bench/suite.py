@@ -0,0 +1,243 @@
+"""
+Time the core hot paths against synthetic data of increasing size
+
+    python -m bench.suite [--scales 150,10000,100000,1000000] [--output results.json]
+    python -m bench.suite --compare before.json after.json
+
+Each scale runs in a fresh interpreter against a league written by
+bench.synthetic into a temporary data directory, with GitHub served by
+bench.fake_github and the background sync held back so it only runs when
+it is timed. Timed, in order:
+
+    store_load          loading the data store from the JSON files
+    load_data_miss/hit  the shared page data cache after a change / unchanged
+    leaderboard_*       full leaderboard, top 20 and a rank lookup
+    team_history*       full history and first page of sampled teams
+    excel_full          backup_to_excel into an empty Excel directory
+    place_bet           sequential bets on upcoming matches
+    excel_incremental   backup_to_excel after those bets
+    update_result       settling the upcoming match with the most bets
+    compaction          waiting for any journal compaction that settling started
+    github_sync         a forced flush of every dataset to the fake GitHub
+
+The Excel steps are skipped above --excel-max-bets, since openpyxl needs
+minutes for a million rows. Results are JSON: per scale the row counts,
+file sizes and, per step, the number of calls with median, p95 and max
+milliseconds. --compare prints the median ratio of two result files.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCALES = [150, 10000, 100000]
+
+
+def _timings(seconds):
+    ordered = sorted(seconds)
+    return {
+        "calls": len(ordered),
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def _child(args):
+    from bench.fake_github import FakeGitHub
+    from core import excel_storage
+    from core.betting import place_bet
+    from core.leaderboard import get_leaderboard, get_team_rank
+    from core.results import update_result
+    from core.storage import DataStore, create_backend, get_store
+    from core.sync_queue import flush_sync, get_sync_worker
+    from core.team_history import get_team_history, get_team_history_page
+    from ui.data_cache import load_data
+
+    rng = random.Random(args.seed)
+    github = FakeGitHub().start()
+    github.configure_env()
+    results = {}
+
+    results["store_load"] = _timings([_time(DataStore, create_backend())[0] for _ in range(args.repeat)])
+    store = get_store()
+    team_names = [team["team"] for team in store.teams]
+
+    misses, hits = [], []
+    for _ in range(args.repeat):
+        with store.lock:
+            store.touch("teams", "matches")
+        misses.append(_time(load_data)[0])
+        hits.append(_time(load_data)[0])
+    results["load_data_miss"] = _timings(misses)
+    results["load_data_hit"] = _timings(hits)
+
+    results["leaderboard_full"] = _timings([_time(get_leaderboard)[0] for _ in range(args.repeat)])
+    results["leaderboard_top20"] = _timings([_time(get_leaderboard, 20)[0] for _ in range(args.calls)])
+    sample = rng.sample(team_names, min(args.calls, len(team_names)))
+    results["leaderboard_rank"] = _timings([_time(get_team_rank, name)[0] for name in sample])
+    results["team_history"] = _timings([_time(get_team_history, name)[0] for name in sample])
+    results["team_history_page"] = _timings([_time(get_team_history_page, name, 0, 10)[0] for name in sample])
+
+    excel = excel_storage.EXCEL_AVAILABLE and len(store.bets) <= args.excel_max_bets
+    if excel:
+        shutil.rmtree(excel_storage.EXCEL_DIR, ignore_errors=True)
+        results["excel_full"] = _timings([_time(excel_storage.backup_to_excel)[0]])
+    else:
+        # Keep the sync daemon from writing the Excel backup in the background
+        excel_storage.EXCEL_AVAILABLE = False
+    get_sync_worker()
+
+    # New bets from teams that haven't bet on an upcoming match yet
+    upcoming = [m for m in store.matches if not m.get("winner") and m["team1"] and m["team2"]]
+    placed = []
+    for match in upcoming:
+        for name in rng.sample(team_names, len(team_names)):
+            if len(placed) == args.calls:
+                break
+            team = store.get_team(name)
+            if store.get_bet(match["match_id"], name) or team["balance"] < 500000:
+                continue
+            prediction = team["home_team"] if team["home_team"] in (match["team1"], match["team2"]) \
+                else rng.choice([match["team1"], match["team2"]])
+            seconds, message = _time(place_bet, name, match["match_id"], prediction, 500000)
+            if "successfully" not in message:
+                raise SystemExit(f"place_bet failed: {message}")
+            placed.append(seconds)
+    results["place_bet"] = _timings(placed)
+
+    if excel:
+        results["excel_incremental"] = _timings([_time(excel_storage.backup_to_excel)[0]])
+
+    match = max(upcoming, key=lambda m: len(store.get_pending_bets(m["match_id"])))
+    settled_bets = len(store.get_pending_bets(match["match_id"]))
+    seconds, message = _time(update_result, match["match_id"], match["team1"])
+    if "updated" not in message:
+        raise SystemExit(f"update_result failed: {message}")
+    results["update_result"] = {**_timings([seconds]), "bets_settled": settled_bets}
+
+    start = time.perf_counter()
+    while store._compacting:
+        time.sleep(0.005)
+    results["compaction"] = _timings([time.perf_counter() - start])
+
+    seconds, (success, message) = _time(flush_sync, (), True)
+    if not success:
+        raise SystemExit(f"GitHub sync failed: {message}")
+    results["github_sync"] = {**_timings([seconds]), "requests": sum(github.request_counts.values())}
+    github.stop()
+
+    print(json.dumps({
+        "rows": {"teams": len(store.teams), "matches": len(store.matches), "bets": len(store.bets)},
+        "steps": results,
+    }))
+
+
+def _run_scale(n_bets, args):
+    from bench.synthetic import write
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write(data_dir, n_bets, args.seed)
+        sizes = {name: os.path.getsize(os.path.join(data_dir, name)) for name in sorted(os.listdir(data_dir))}
+        env = {
+            **os.environ,
+            "SPL_DATA_DIR": data_dir,
+            "PYTHONPATH": ROOT,
+            # Background flushes only happen when github_sync asks for one
+            "SPL_SYNC_INTERVAL": "3600",
+            "SPL_SYNC_MAX_CHANGES": str(10 ** 9),
+        }
+        command = [sys.executable, "-m", "bench.suite", "--child", "--seed", str(args.seed),
+                   "--repeat", str(args.repeat), "--calls", str(args.calls),
+                   "--excel-max-bets", str(args.excel_max_bets)]
+        output = subprocess.run(command, cwd=data_dir, env=env, capture_output=True, text=True)
+        if output.returncode:
+            raise SystemExit(f"Scale {n_bets} failed:\n{output.stderr}")
+    return {**json.loads(output.stdout.strip().splitlines()[-1]), "file_bytes": sizes}
+
+
+def run(scales, args):
+    """
+    Returns:
+        dict: "meta" (commit, Python, platform, time, settings) and "scales"
+              keyed by the requested bet count
+    """
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                            capture_output=True, text=True).stdout.strip()
+    results = {
+        "meta": {
+            "commit": commit or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "calls": args.calls,
+        },
+        "scales": {},
+    }
+    for n_bets in scales:
+        print(f"Running scale {n_bets:,}...", file=sys.stderr)
+        results["scales"][str(n_bets)] = _run_scale(n_bets, args)
+    return results
+
+
+def compare(before_path, after_path):
+    """Print the median time of every step in after relative to before"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'scale':>9} {'step':<20} {'before ms':>11} {'after ms':>11} {'ratio':>7}")
+    for scale, result in after["scales"].items():
+        old_steps = before["scales"].get(scale, {}).get("steps", {})
+        for step, timing in result["steps"].items():
+            if step not in old_steps:
+                continue
+            old, new = old_steps[step]["median_ms"], timing["median_ms"]
+            ratio = f"{new / old:.2f}x" if old else "-"
+            print(f"{scale:>9} {step:<20} {old:>11.2f} {new:>11.2f} {ratio:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="comma-separated bet counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the whole-dataset steps")
+    parser.add_argument("--calls", type=int, default=100, help="calls of the per-team steps and bets placed")
+    parser.add_argument("--excel-max-bets", type=int, default=100000)
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        results = run([int(float(scale)) for scale in args.scales.split(",")], args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic league data in the schema of data/*.json
+
+    python -m bench.synthetic --bets 100000 --output /tmp/spl-data
+
+The same seed and size always produce the same files. Teams are added as
+the bet count grows (each team bets on about 70% of the 74 matches), the
+first 60% of matches have results, and bets are generated in match order
+against each team's running balance, so every balance is consistent with
+the ledger and no bet exceeds what the team could afford.
+"""
+import argparse
+import json
+import math
+import os
+import random
+from datetime import date, datetime, timedelta
+
+from core.storage import DATASETS, STARTING_BALANCE
+
+IPL_TEAMS = ["CSK", "DC", "GT", "KKR", "LSG", "MI", "PBKS", "RR", "RCB", "SRH"]
+VENUES = {
+    "CSK": "MA Chidambaram Stadium, Chennai",
+    "DC": "Arun Jaitley Stadium, Delhi",
+    "GT": "Narendra Modi Stadium, Ahmedabad",
+    "KKR": "Eden Gardens, Kolkata",
+    "LSG": "BRSABV Ekana Cricket Stadium, Lucknow",
+    "MI": "Wankhede Stadium, Mumbai",
+    "PBKS": "Maharaja Yadavindra Singh Stadium, Mullanpur",
+    "RR": "Sawai Mansingh Stadium, Jaipur",
+    "RCB": "M. Chinnaswamy Stadium, Bengaluru",
+    "SRH": "Rajiv Gandhi International Stadium, Hyderabad",
+}
+N_MATCHES = 74
+PARTICIPATION = 0.7
+PLAYED_FRACTION = 0.6
+SEASON_START = date(2025, 3, 22)
+
+
+def generate(n_bets, seed=0):
+    """
+    Build teams, matches and bets
+
+    Args:
+        n_bets: Approximate number of bets
+        seed: Random seed
+
+    Returns:
+        tuple: (teams, matches, bets) lists of dicts
+    """
+    rng = random.Random(seed)
+    n_teams = max(8, math.ceil(n_bets / (N_MATCHES * PARTICIPATION)))
+    participation = min(n_bets / (n_teams * N_MATCHES), 1.0)
+    played = int(N_MATCHES * PLAYED_FRACTION)
+
+    matches = []
+    for match_id in range(1, N_MATCHES + 1):
+        team1, team2 = rng.sample(IPL_TEAMS, 2)
+        matches.append({
+            "match_id": match_id,
+            "date": (SEASON_START + timedelta(days=(match_id - 1) * 62 // N_MATCHES)).isoformat(),
+            "team1": team1,
+            "team2": team2,
+            "venue": VENUES[team1],
+            "winner": rng.choice([team1, team2]) if match_id <= played else None,
+        })
+
+    teams = [
+        {"team": f"Synthetic {i:06d}", "home_team": IPL_TEAMS[i % len(IPL_TEAMS)], "balance": STARTING_BALANCE}
+        for i in range(n_teams)
+    ]
+
+    bets = []
+    for match in matches:
+        placed_at = datetime.fromisoformat(match["date"]) - timedelta(hours=12)
+        for team in teams:
+            if rng.random() >= participation:
+                continue
+            amount = rng.randint(1, 6) * 500000
+            if team["balance"] < amount:
+                continue
+            is_home_team = team["home_team"] in (match["team1"], match["team2"])
+            prediction = team["home_team"] if is_home_team else rng.choice([match["team1"], match["team2"]])
+            team["balance"] -= amount
+
+            status, winnings = "pending", 0
+            if match["winner"]:
+                if prediction == match["winner"]:
+                    status, winnings = "won", amount * (4 if is_home_team else 2)
+                else:
+                    status = "lost"
+                team["balance"] += winnings
+
+            bets.append({
+                "match_id": match["match_id"],
+                "team": team["team"],
+                "prediction": prediction,
+                "amount": amount,
+                "is_home_team": is_home_team,
+                "status": status,
+                "winnings": winnings,
+                "timestamp": (placed_at + timedelta(seconds=len(bets) % 36000)).isoformat(),
+            })
+    return teams, matches, bets
+
+
+def write(data_dir, n_bets, seed=0):
+    """Write teams.json, matches.json and bets.json for a synthetic league; returns the counts"""
+    os.makedirs(data_dir, exist_ok=True)
+    teams, matches, bets = generate(n_bets, seed)
+    for name, rows in (("teams", teams), ("matches", matches), ("bets", bets)):
+        with open(os.path.join(data_dir, DATASETS[name]), "w") as f:
+            json.dump(rows, f, indent=2)
+    return {"teams": len(teams), "matches": len(matches), "bets": len(bets)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bets", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True, help="data directory to write")
+    args = parser.parse_args()
+    print(json.dumps(write(args.output, args.bets, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
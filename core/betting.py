@@ -1,33 +1,21 @@
-import json
 from datetime import datetime
-from core.excel_storage import backup_to_excel
-from core.github_storage import update_json_file, batch_update_github_files
-
-def place_bet(team_name, match_id, prediction, amount):
-    # Load data from JSON
-    with open("data/teams.json") as f:
-        teams = json.load(f)
-    with open("data/matches.json") as f:
-        matches = json.load(f)
-    
-    # Handle empty or invalid bets.json file
-    try:
-        with open("data/bets.json") as f:
-            bets = json.load(f)
-    except json.JSONDecodeError:
-        bets = []
-
-    match = next((m for m in matches if m["match_id"] == match_id), None)
+from core.metrics import span, traced
+from core.sync_queue import enqueue_sync
+from core.writer import get_writer
+
+@traced("place_bet", "validate")
+def _prepare_bet(store, team_name, match_id, prediction, amount):
+    """Validate a bet against the current data; returns the new bet or an error message"""
+    match = store.get_match(match_id)
     if not match:
         return f"Match ID {match_id} not found."
 
-    team_info = next((t for t in teams if t["team"] == team_name), None)
+    team_info = store.get_team(team_name)
     if not team_info:
         return f"Team {team_name} not registered."
 
     # Check if team has already placed a bet for this match
-    existing_bet = next((b for b in bets if b["match_id"] == match_id and b["team"] == team_name), None)
-    if existing_bet:
+    if store.get_bet(match_id, team_name):
         return f"Your team has already placed a bet for match {match_id}."
 
     # Check if amount is in multiples of 5 lakhs (500,000)
@@ -41,10 +29,7 @@ def place_bet(team_name, match_id, prediction, amount):
     if is_home_team and prediction != team_info["home_team"]:
         return f"Must bet on home team: {team_info['home_team']}"
 
-    # Deduct the bet amount from the team's balance immediately
-    team_info["balance"] -= amount
-
-    new_bet = {
+    return {
         "match_id": match_id,
         "team": team_name,
         "prediction": prediction,
@@ -54,22 +39,19 @@ def place_bet(team_name, match_id, prediction, amount):
         "winnings": 0,
         "timestamp": datetime.now().isoformat()
     }
-    
-    bets.append(new_bet)
-    
-    # Save to local files first
-    with open("data/bets.json", "w") as f:
-        json.dump(bets, f, indent=2)
-    with open("data/teams.json", "w") as f:
-        json.dump(teams, f, indent=2)
-    
-    # Update GitHub repository using batch update
-    batch_update_github_files({
-        "data/bets.json": bets,
-        "data/teams.json": teams
-    })
-    
-    # Backup to Excel
-    backup_to_excel()
-    
-    return f"Bet placed successfully for {team_name} on match {match_id}."
\ No newline at end of file
+
+@traced("place_bet")
+def place_bet(team_name, match_id, prediction, amount):
+    # Validate and commit through the single writer, which batches concurrent
+    # bets into one journal write. The bet amount is deducted from the team's
+    # balance as part of the commit.
+    with span("place_bet", "commit"):
+        result = get_writer().submit(lambda store: _prepare_bet(store, team_name, match_id, prediction, amount))
+    if isinstance(result, str):
+        return result
+
+    # GitHub sync and Excel backup run in the background
+    with span("place_bet", "enqueue_sync"):
+        enqueue_sync(["bets", "teams"])
+
+    return f"Bet placed successfully for {team_name} on match {match_id}."
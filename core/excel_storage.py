@@ -1,112 +1,144 @@
-import pandas as pd
+import hashlib
+import importlib.util
+import json
 import os
 from datetime import datetime
-import json
 import warnings
+from core.metrics import span, traced
+from core.storage import DATA_DIR, _atomic_write, _read_json, file_lock, get_store
 
 # Define Excel file paths
-EXCEL_DIR = "data/excel"
+EXCEL_DIR = os.path.join(DATA_DIR, "excel")
 TEAMS_EXCEL = os.path.join(EXCEL_DIR, "teams.xlsx")
 MATCHES_EXCEL = os.path.join(EXCEL_DIR, "matches.xlsx")
 BETS_EXCEL = os.path.join(EXCEL_DIR, "bets.xlsx")
+# Content hash of each dataset at its last backup
+BACKUP_STATE_FILE = os.path.join(EXCEL_DIR, ".backup_state.json")
+# Held while writing the workbooks, so server processes sharing DATA_DIR take turns
+BACKUP_LOCK_FILE = os.path.join(EXCEL_DIR, ".backup.lock")
 
-# Ensure Excel directory exists
-os.makedirs(EXCEL_DIR, exist_ok=True)
+BET_COLUMNS = ["match_id", "team", "prediction", "amount", "is_home_team", "status", "winnings", "timestamp"]
 
+# pandas and openpyxl are imported inside the functions that use them, so
+# importing this module (and checking the Excel files) stays cheap.
 # Check if openpyxl is available
-try:
-    import openpyxl
-    EXCEL_AVAILABLE = True
-except ImportError:
-    EXCEL_AVAILABLE = False
+EXCEL_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+if not EXCEL_AVAILABLE:
     warnings.warn("openpyxl not installed. Excel backup will be disabled. Install with 'pip install openpyxl'")
 
+@traced("excel_backup", "init")
 def init_excel_files():
     """Initialize Excel files if they don't exist"""
     if not EXCEL_AVAILABLE:
         return
+
+    # Cheap check first: pandas is only imported if a file has to be created
+    if all(os.path.exists(path) for path in (TEAMS_EXCEL, MATCHES_EXCEL, BETS_EXCEL)):
+        return
+    import pandas as pd
+
+    # Ensure Excel directory exists
+    os.makedirs(EXCEL_DIR, exist_ok=True)
+    # Another server process may be creating them too
+    with file_lock(BACKUP_LOCK_FILE):
     
-    # Teams Excel
-    if not os.path.exists(TEAMS_EXCEL):
-        # Load from JSON if available
-        try:
-            with open("data/teams.json") as f:
-                teams = json.load(f)
-            df_teams = pd.DataFrame(teams)
-        except:
-            df_teams = pd.DataFrame(columns=["team", "balance", "home_team"])
-        df_teams.to_excel(TEAMS_EXCEL, index=False)
+        # Teams Excel
+        if not os.path.exists(TEAMS_EXCEL):
+            # Load from the data store if available
+            try:
+                df_teams = pd.DataFrame(get_store().teams)
+            except:
+                df_teams = pd.DataFrame(columns=["team", "balance", "home_team"])
+            df_teams.to_excel(TEAMS_EXCEL, index=False)
     
-    # Matches Excel
-    if not os.path.exists(MATCHES_EXCEL):
-        try:
-            with open("data/matches.json") as f:
-                matches = json.load(f)
-            df_matches = pd.DataFrame(matches)
-            # Reorder columns to put venue at the end
-            if "venue" in df_matches.columns and "winner" in df_matches.columns:
-                cols = [col for col in df_matches.columns if col not in ["venue", "winner"]]
-                cols = cols + ["winner", "venue"]
-                df_matches = df_matches[cols]
-        except:
-            df_matches = pd.DataFrame(columns=["match_id", "date", "team1", "team2", "winner", "venue"])
-        df_matches.to_excel(MATCHES_EXCEL, index=False)
+        # Matches Excel
+        if not os.path.exists(MATCHES_EXCEL):
+            try:
+                df_matches = _matches_frame(get_store().matches)
+            except:
+                df_matches = pd.DataFrame(columns=["match_id", "date", "team1", "team2", "winner", "venue"])
+            df_matches.to_excel(MATCHES_EXCEL, index=False)
     
-    # Bets Excel
-    if not os.path.exists(BETS_EXCEL):
-        try:
-            with open("data/bets.json") as f:
-                bets = json.load(f)
-            df_bets = pd.DataFrame(bets)
-        except:
-            df_bets = pd.DataFrame(columns=["match_id", "team", "prediction", "amount", 
-                                           "is_home_team", "status", "winnings", "timestamp"])
-        df_bets.to_excel(BETS_EXCEL, index=False)
+        # Bets Excel
+        if not os.path.exists(BETS_EXCEL):
+            try:
+                df_bets = pd.DataFrame(get_store().bets, columns=BET_COLUMNS)
+            except:
+                df_bets = pd.DataFrame(columns=BET_COLUMNS)
+            df_bets.to_excel(BETS_EXCEL, index=False)
+
+def _matches_frame(matches):
+    import pandas as pd
+    df_matches = pd.DataFrame(matches)
+    # Reorder columns to put venue at the end after winner
+    if "venue" in df_matches.columns and "winner" in df_matches.columns:
+        cols = [col for col in df_matches.columns if col not in ["venue", "winner"]]
+        cols = cols + ["winner", "venue"]
+        df_matches = df_matches[cols]
+    return df_matches
+
+def _content_hash(rows):
+    """Hash of a dataset's rows, the same in every process and across restarts"""
+    return hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode()).hexdigest()
+
+# Store version of each dataset when this process last found it backed up, so
+# unchanged datasets aren't hashed again on every backup
+_checked_versions = {}
 
+@traced("excel_backup")
 def backup_to_excel():
-    """Backup all JSON data to Excel files"""
+    """
+    Backup the data store to Excel files.
+
+    Only datasets whose content changed since the last backup are written.
+    The content hash of each backed up dataset is kept in BACKUP_STATE_FILE,
+    so restarts and other server processes sharing DATA_DIR skip unchanged
+    workbooks too.
+    """
     if not EXCEL_AVAILABLE:
         return
-    
-    # Backup teams
-    try:
-        with open("data/teams.json") as f:
-            teams = json.load(f)
-        df_teams = pd.DataFrame(teams)
-        df_teams.to_excel(TEAMS_EXCEL, index=False)
-    except Exception as e:
-        warnings.warn(f"Failed to backup teams to Excel: {str(e)}")
-    
-    # Backup matches
-    try:
-        with open("data/matches.json") as f:
-            matches = json.load(f)
-        df_matches = pd.DataFrame(matches)
-        
-        # Reorder columns to put venue at the end after winner
-        if "venue" in df_matches.columns and "winner" in df_matches.columns:
-            cols = [col for col in df_matches.columns if col not in ["venue", "winner"]]
-            cols = cols + ["winner", "venue"]
-            df_matches = df_matches[cols]
-            
-        df_matches.to_excel(MATCHES_EXCEL, index=False)
-    except Exception as e:
-        warnings.warn(f"Failed to backup matches to Excel: {str(e)}")
-    
-    # Backup bets
-    try:
-        with open("data/bets.json") as f:
-            bets = json.load(f)
-        df_bets = pd.DataFrame(bets)
-        df_bets.to_excel(BETS_EXCEL, index=False)
-    except Exception as e:
-        warnings.warn(f"Failed to backup bets to Excel: {str(e)}")
+
+    import pandas as pd
+    writers = {
+        "teams": (TEAMS_EXCEL, lambda rows: pd.DataFrame(rows)),
+        "matches": (MATCHES_EXCEL, _matches_frame),
+        "bets": (BETS_EXCEL, lambda rows: pd.DataFrame(rows, columns=BET_COLUMNS)),
+    }
+    os.makedirs(EXCEL_DIR, exist_ok=True)
+    with file_lock(BACKUP_LOCK_FILE):
+        store = get_store()
+        state = _read_json(BACKUP_STATE_FILE, {})
+
+        # Copy only what may need writing, so the lock is held briefly
+        with store.lock:
+            versions = {name: store.version(name) for name in writers}
+            data = {name: [dict(row) for row in getattr(store, name)]
+                    for name in writers if _checked_versions.get(name) != versions[name]}
+
+        changed = False
+        for name, rows in data.items():
+            path, frame = writers[name]
+            digest = _content_hash(rows)
+            if state.get(name) == digest and os.path.exists(path):
+                _checked_versions[name] = versions[name]
+                continue
+            try:
+                with span("excel_backup", name):
+                    frame(rows).to_excel(path, index=False)
+                state[name] = digest
+                _checked_versions[name] = versions[name]
+                changed = True
+            except Exception as e:
+                warnings.warn(f"Failed to backup {name} to Excel: {str(e)}")
+
+        if changed:
+            _atomic_write(BACKUP_STATE_FILE, json.dumps(state))
 
 def load_teams_excel():
     """Load teams data from Excel"""
     if not EXCEL_AVAILABLE:
-        with open("data/teams.json") as f:
-            return json.load(f)
+        return [dict(row) for row in get_store().teams]
+    import pandas as pd
             
     if not os.path.exists(TEAMS_EXCEL):
         init_excel_files()
@@ -116,8 +148,8 @@ def load_teams_excel():
 def load_matches_excel():
     """Load matches data from Excel"""
     if not EXCEL_AVAILABLE:
-        with open("data/matches.json") as f:
-            return json.load(f)
+        return [dict(row) for row in get_store().matches]
+    import pandas as pd
             
     if not os.path.exists(MATCHES_EXCEL):
         init_excel_files()
@@ -129,11 +161,8 @@ def load_matches_excel():
 def load_bets_excel():
     """Load bets data from Excel"""
     if not EXCEL_AVAILABLE:
-        try:
-            with open("data/bets.json") as f:
-                return json.load(f)
-        except:
-            return []
+        return [dict(row) for row in get_store().bets]
+    import pandas as pd
             
     if not os.path.exists(BETS_EXCEL):
         init_excel_files()
@@ -144,6 +173,7 @@ def save_teams_excel(teams):
     """Save teams data to Excel"""
     if not EXCEL_AVAILABLE:
         return
+    import pandas as pd
         
     df = pd.DataFrame(teams)
     df.to_excel(TEAMS_EXCEL, index=False)
@@ -152,6 +182,7 @@ def save_matches_excel(matches):
     """Save matches data to Excel"""
     if not EXCEL_AVAILABLE:
         return
+    import pandas as pd
         
     df = pd.DataFrame(matches)
     df.to_excel(MATCHES_EXCEL, index=False)
@@ -160,6 +191,7 @@ def save_bets_excel(bets):
     """Save bets data to Excel"""
     if not EXCEL_AVAILABLE:
         return
+    import pandas as pd
         
     df = pd.DataFrame(bets)
     df.to_excel(BETS_EXCEL, index=False) 
\ No newline at end of file
@@ -4,7 +4,187 @@ import base64
 import streamlit as st
 import os
 import time
+import hashlib
+import threading
+from collections import deque
+from requests.adapters import HTTPAdapter
+from core.metrics import record, span, traced
+from core.storage import DATA_DIR, _atomic_write, _read_json
 
+# Default GitHub REST API endpoint (overridable for a local fake server)
+GITHUB_API_URL = "https://api.github.com"
+
+def get_github_settings():
+    """
+    Get the GitHub settings from the Streamlit secrets ([github] token, repo,
+    branch and optional api_url), falling back to the SPL_GITHUB_TOKEN,
+    SPL_GITHUB_REPO, SPL_GITHUB_BRANCH and SPL_GITHUB_API_URL environment variables.
+
+    Returns:
+        dict: token, repo, branch and api_url, or None if GitHub is not configured
+    """
+    try:
+        if "github" in st.secrets:
+            github = st.secrets["github"]
+            return {
+                "token": github["token"],
+                "repo": github["repo"],
+                "branch": github.get("branch", "main"),
+                "api_url": github.get("api_url", GITHUB_API_URL),
+            }
+    except Exception:
+        pass
+
+    if os.environ.get("SPL_GITHUB_TOKEN") and os.environ.get("SPL_GITHUB_REPO"):
+        return {
+            "token": os.environ["SPL_GITHUB_TOKEN"],
+            "repo": os.environ["SPL_GITHUB_REPO"],
+            "branch": os.environ.get("SPL_GITHUB_BRANCH", "main"),
+            "api_url": os.environ.get("SPL_GITHUB_API_URL", GITHUB_API_URL),
+        }
+    return None
+
+def is_github_configured():
+    """Check whether GitHub credentials are configured"""
+    return get_github_settings() is not None
+
+def _headers(token):
+    return {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+# Retry policy for GitHub API calls: server errors, conflicts and rate limiting
+RETRY_STATUSES = frozenset({409, 429, 500, 502, 503, 504})
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # seconds, doubled on every attempt
+BACKOFF_MAX = 30
+REQUEST_TIMEOUT = 15
+# A Contents API PUT conflict means our SHA is stale; it is resolved by refetching, not retrying
+CONTENTS_PUT_RETRY_STATUSES = RETRY_STATUSES - {409}
+
+# Timings of the most recent GitHub API requests
+_request_timings = deque(maxlen=500)
+_session = None
+
+def get_session():
+    """Shared keep-alive session, so sync calls reuse pooled TLS connections"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+def get_request_timings():
+    """
+    Timings of recent GitHub API requests, oldest first
+    
+    Returns:
+        list: dicts with method, path, status, attempt and seconds
+    """
+    return list(_request_timings)
+
+# Last known blob SHA of every synced file and the branch head, per repository.
+# Unchanged files are skipped without a network call and PUTs use the cached
+# SHA directly; a conflict invalidates the entry.
+SHA_CACHE_FILE = os.path.join(DATA_DIR, ".github_sha_cache.json")
+_sha_cache = None
+_sha_cache_lock = threading.Lock()
+
+def git_blob_sha(content):
+    """SHA-1 git assigns to a blob with this content, used as the content hash"""
+    data = content.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def _cache_entry(settings):
+    global _sha_cache
+    if _sha_cache is None:
+        _sha_cache = _read_json(SHA_CACHE_FILE, {})
+    key = f"{settings['api_url']}/{settings['repo']}@{settings['branch']}"
+    return _sha_cache.setdefault(key, {"files": {}})
+
+def get_cached_sha(settings, file_path):
+    """Blob SHA of a file as of our last successful sync, or None"""
+    with _sha_cache_lock:
+        return _cache_entry(settings)["files"].get(file_path)
+
+def _get_cached_head(settings):
+    with _sha_cache_lock:
+        entry = _cache_entry(settings)
+        return entry.get("head"), entry.get("tree")
+
+def _update_sha_cache(settings, files=None, head=None, tree=None, clear=False):
+    with _sha_cache_lock:
+        entry = _cache_entry(settings)
+        if clear:
+            entry.clear()
+            entry["files"] = {}
+        entry["files"].update(files or {})
+        if head:
+            entry["head"] = head
+            entry["tree"] = tree
+        _atomic_write(SHA_CACHE_FILE, json.dumps(_sha_cache, indent=2))
+
+def clear_sha_cache():
+    """Forget the cached SHAs, so the next sync compares every file with GitHub"""
+    settings = get_github_settings()
+    if settings:
+        _update_sha_cache(settings, clear=True)
+
+def _retry_delay(response, attempt):
+    """How long to wait before retrying, honouring GitHub's rate limit headers"""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), BACKOFF_MAX)
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = response.headers.get("X-RateLimit-Reset")
+        if reset and reset.isdigit():
+            return min(max(int(reset) - time.time(), 0), BACKOFF_MAX)
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX)
+
+def _is_retryable(response, retry_statuses):
+    if response.status_code in retry_statuses:
+        return True
+    # GitHub reports an exhausted primary rate limit as 403 with no requests remaining
+    return response.status_code == 403 and response.headers.get("X-RateLimit-Remaining") == "0"
+
+def _request(method, url, retry_statuses=RETRY_STATUSES, **kwargs):
+    """
+    Send a GitHub API request through the pooled session
+    
+    Retries with bounded exponential backoff on connection errors and on the
+    given statuses, and records the duration of every attempt.
+    """
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    path = url.split("/repos/", 1)[-1]
+    # Histogram stage per endpoint ("GET contents/data", "POST git/trees", ...)
+    stage = f"{method} {'/'.join(path.split('/')[2:4]) or 'repo'}"
+    for attempt in range(MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            seconds = time.perf_counter() - start
+            _request_timings.append({"method": method, "path": path, "status": None,
+                                     "attempt": attempt, "seconds": seconds})
+            record("github", stage, seconds)
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+            continue
+
+        seconds = time.perf_counter() - start
+        _request_timings.append({"method": method, "path": path, "status": response.status_code,
+                                 "attempt": attempt, "seconds": seconds})
+        record("github", stage, seconds)
+        if attempt == MAX_RETRIES or not _is_retryable(response, retry_statuses):
+            return response
+        time.sleep(_retry_delay(response, attempt))
+
+@traced("github_sync", "update_json_file")
 def update_json_file(file_path, data):
     """
     Update a JSON file in the GitHub repository
@@ -18,75 +198,74 @@ def update_json_file(file_path, data):
     """
     try:
         # GitHub API settings
-        if "github" not in st.secrets:
+        settings = get_github_settings()
+        if not settings:
             st.error("GitHub secrets not configured. Please add GitHub credentials to .streamlit/secrets.toml")
             return False
             
-        token = st.secrets["github"]["token"]
-        repo = st.secrets["github"]["repo"]
-        branch = st.secrets["github"]["branch"]
-        
-        # Add a small delay to avoid rate limiting and race conditions
-        time.sleep(1)
+        branch = settings["branch"]
         
         # API endpoint for getting and updating file
-        api_url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
+        api_url = f"{settings['api_url']}/repos/{settings['repo']}/contents/{file_path}"
         
         # Headers for authentication
-        headers = {
-            "Authorization": f"token {token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
+        headers = _headers(settings["token"])
         
-        # Get the current file to obtain its SHA - always get the latest version
-        response = requests.get(api_url, headers=headers, params={"ref": branch})
+        new_content = json.dumps(data, indent=2)
+        new_sha = git_blob_sha(new_content)
+        sha = get_cached_sha(settings, file_path)
         
-        # Handle file not found (create new file)
-        if response.status_code == 404:
-            st.info(f"File {file_path} not found on GitHub. Creating new file.")
-            
-            # Prepare the content
-            content = json.dumps(data, indent=2)
-            encoded_content = base64.b64encode(content.encode()).decode()
+        # Same content as the last successful sync: no network call needed
+        if sha == new_sha:
+            st.info(f"No changes detected in {file_path}, skipping update")
+            return True
+        
+        # Without a cached SHA, get the current file to obtain it
+        if sha is None:
+            response = _request("GET", api_url, headers=headers, params={"ref": branch})
             
-            # Create the file payload
-            create_data = {
-                "message": f"Create {file_path} via Streamlit app",
-                "content": encoded_content,
-                "branch": branch
-            }
+            # Handle file not found (create new file)
+            if response.status_code == 404:
+                st.info(f"File {file_path} not found on GitHub. Creating new file.")
+                
+                # Prepare the content
+                encoded_content = base64.b64encode(new_content.encode()).decode()
+                
+                # Create the file payload
+                create_data = {
+                    "message": f"Create {file_path} via Streamlit app",
+                    "content": encoded_content,
+                    "branch": branch
+                }
+                
+                # Create the file
+                create_response = _request("PUT", api_url, CONTENTS_PUT_RETRY_STATUSES, headers=headers, json=create_data)
+                
+                if create_response.status_code in [200, 201]:
+                    _update_sha_cache(settings, files={file_path: new_sha})
+                    st.success(f"Successfully created {file_path} on GitHub")
+                    return True
+                else:
+                    error_msg = f"Error creating file: {create_response.status_code}"
+                    if hasattr(create_response, 'json'):
+                        error_msg += f" - {create_response.json().get('message', '')}"
+                    st.error(error_msg)
+                    return False
+                    
+            elif response.status_code != 200:
+                error_msg = f"Error getting file: {response.status_code}"
+                if hasattr(response, 'json'):
+                    error_msg += f" - {response.json().get('message', '')}"
+                st.error(error_msg)
+                return False
             
-            # Create the file
-            create_response = requests.put(api_url, headers=headers, json=create_data)
+            sha = response.json()["sha"]
+            _update_sha_cache(settings, files={file_path: sha})
             
-            if create_response.status_code in [200, 201]:
-                st.success(f"Successfully created {file_path} on GitHub")
+            # If content is the same, no need to update
+            if sha == new_sha:
+                st.info(f"No changes detected in {file_path}, skipping update")
                 return True
-            else:
-                error_msg = f"Error creating file: {create_response.status_code}"
-                if hasattr(create_response, 'json'):
-                    error_msg += f" - {create_response.json().get('message', '')}"
-                st.error(error_msg)
-                return False
-                
-        elif response.status_code != 200:
-            error_msg = f"Error getting file: {response.status_code}"
-            if hasattr(response, 'json'):
-                error_msg += f" - {response.json().get('message', '')}"
-            st.error(error_msg)
-            return False
-        
-        file_info = response.json()
-        sha = file_info["sha"]
-        
-        # Check if the content is different before updating
-        current_content = base64.b64decode(file_info["content"]).decode('utf-8')
-        new_content = json.dumps(data, indent=2)
-        
-        # If content is the same, no need to update
-        if current_content.strip() == new_content.strip():
-            st.info(f"No changes detected in {file_path}, skipping update")
-            return True
         
         # Prepare the update
         encoded_content = base64.b64encode(new_content.encode()).decode()
@@ -100,17 +279,18 @@ def update_json_file(file_path, data):
         }
         
         # Update the file
-        update_response = requests.put(api_url, headers=headers, json=update_data)
+        update_response = _request("PUT", api_url, CONTENTS_PUT_RETRY_STATUSES, headers=headers, json=update_data)
         
         if update_response.status_code in [200, 201]:
+            _update_sha_cache(settings, files={file_path: new_sha})
             st.success(f"Successfully updated {file_path} on GitHub")
             return True
         elif update_response.status_code == 409:
-            # Handle conflict by getting the latest version and trying again
+            # The cached SHA is stale: get the latest version and try again
             st.warning(f"Conflict detected for {file_path}, getting latest version and retrying...")
             
             # Get the latest file version
-            latest_response = requests.get(api_url, headers=headers, params={"ref": branch})
+            latest_response = _request("GET", api_url, headers=headers, params={"ref": branch})
             if latest_response.status_code != 200:
                 st.error(f"Error getting latest version: {latest_response.status_code}")
                 return False
@@ -120,9 +300,10 @@ def update_json_file(file_path, data):
             
             # Update with the latest SHA
             update_data["sha"] = latest_sha
-            retry_response = requests.put(api_url, headers=headers, json=update_data)
+            retry_response = _request("PUT", api_url, CONTENTS_PUT_RETRY_STATUSES, headers=headers, json=update_data)
             
             if retry_response.status_code in [200, 201]:
+                _update_sha_cache(settings, files={file_path: new_sha})
                 st.success(f"Successfully updated {file_path} on GitHub after resolving conflict")
                 return True
             else:
@@ -145,23 +326,18 @@ def update_json_file(file_path, data):
 def test_github_connection():
     """Test the GitHub connection and return status"""
     try:
-        if "github" not in st.secrets:
+        settings = get_github_settings()
+        if not settings:
             return False, "GitHub secrets not configured"
-            
-        token = st.secrets["github"]["token"]
-        repo = st.secrets["github"]["repo"]
         
         # API endpoint for getting repo info
-        api_url = f"https://api.github.com/repos/{repo}"
+        api_url = f"{settings['api_url']}/repos/{settings['repo']}"
         
         # Headers for authentication
-        headers = {
-            "Authorization": f"token {token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
+        headers = _headers(settings["token"])
         
         # Test the connection
-        response = requests.get(api_url, headers=headers)
+        response = _request("GET", api_url, headers=headers)
         
         if response.status_code == 200:
             repo_info = response.json()
@@ -175,10 +351,104 @@ def test_github_connection():
     except Exception as e:
         return False, f"Error connecting to GitHub: {str(e)}"
 
+@traced("github_sync", "commit_files")
+def commit_files(files_data, message=None):
+    """
+    Write several JSON files to GitHub as a single commit using the Git Data API
+    
+    Instead of one Contents API PUT (and one commit) per file, this reads the
+    branch head, creates one tree holding all the files on top of it, creates
+    one commit and moves the branch ref once - a fixed number of round trips
+    however many files change. Files whose blob SHA matches the SHA cache are
+    left out, and the branch head is only read when it isn't cached.
+    
+    Args:
+        files_data: Dictionary mapping file paths to their data
+        message: Commit message
+    
+    Returns:
+        tuple: (success, message)
+    """
+    settings = get_github_settings()
+    if not settings:
+        return False, "GitHub secrets not configured"
+
+    repo_url = f"{settings['api_url']}/repos/{settings['repo']}"
+    ref_path = f"heads/{settings['branch']}"
+    headers = _headers(settings["token"])
+
+    # Only send files whose content differs from what we last pushed
+    with span("github_sync", "serialize"):
+        contents = {file_path: json.dumps(data, indent=2) for file_path, data in files_data.items()}
+        changed = {
+            file_path: content for file_path, content in contents.items()
+            if get_cached_sha(settings, file_path) != git_blob_sha(content)
+        }
+    if not changed:
+        return True, "No changes needed"
+    message = message or f"Update {', '.join(changed)} via Streamlit app"
+
+    tree = [
+        {
+            "path": file_path,
+            "mode": "100644",
+            "type": "blob",
+            "content": content
+        }
+        for file_path, content in changed.items()
+    ]
+
+    # Start from the cached branch head; refetch it if someone else moved the branch
+    head_sha, base_tree = _get_cached_head(settings)
+    for attempt in range(3):
+        if head_sha is None:
+            response = _request("GET", f"{repo_url}/git/ref/{ref_path}", headers=headers)
+            if response.status_code != 200:
+                return False, f"Error getting branch head: {response.status_code}"
+            head_sha = response.json()["object"]["sha"]
+
+            response = _request("GET", f"{repo_url}/git/commits/{head_sha}", headers=headers)
+            if response.status_code != 200:
+                return False, f"Error getting head commit: {response.status_code}"
+            base_tree = response.json()["tree"]["sha"]
+
+        response = _request("POST", f"{repo_url}/git/trees", headers=headers,
+                            json={"base_tree": base_tree, "tree": tree})
+        if response.status_code != 201:
+            return False, f"Error creating tree: {response.status_code}"
+        new_tree = response.json()["sha"]
+        new_shas = {file_path: git_blob_sha(content) for file_path, content in changed.items()}
+
+        # Same tree as the head commit: every file is already up to date
+        if new_tree == base_tree:
+            _update_sha_cache(settings, files=new_shas, head=head_sha, tree=base_tree)
+            return True, "No changes needed"
+
+        response = _request("POST", f"{repo_url}/git/commits", headers=headers,
+                            json={"message": message, "tree": new_tree, "parents": [head_sha]})
+        if response.status_code != 201:
+            return False, f"Error creating commit: {response.status_code}"
+        commit_sha = response.json()["sha"]
+
+        response = _request("PATCH", f"{repo_url}/git/refs/{ref_path}", headers=headers, json={"sha": commit_sha})
+        if response.status_code == 200:
+            _update_sha_cache(settings, files=new_shas, head=commit_sha, tree=new_tree)
+            return True, f"Committed {len(tree)} file(s) as {commit_sha[:7]}"
+        if response.status_code != 422:
+            break
+
+        # The branch moved under us, so the cached head and file SHAs are stale
+        _update_sha_cache(settings, clear=True)
+        head_sha = None
+
+    return False, f"Error updating branch: {response.status_code}"
+
 def batch_update_github_files(files_data):
     """
     Update multiple JSON files on GitHub in a single operation
     
+    All files are written in one commit (see commit_files).
+    
     Args:
         files_data: Dictionary mapping file paths to their data
                    e.g., {"data/teams.json": teams_data}
@@ -187,103 +457,13 @@ def batch_update_github_files(files_data):
         tuple: (success, message)
     """
     try:
-        # GitHub API settings
-        if "github" not in st.secrets:
-            return False, "GitHub secrets not configured"
-            
-        token = st.secrets["github"]["token"]
-        repo = st.secrets["github"]["repo"]
-        branch = st.secrets["github"]["branch"]
-        
-        # Headers for authentication
-        headers = {
-            "Authorization": f"token {token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        results = {}
-        all_success = True
-        
-        # First, get all current files to check their SHA
-        file_info = {}
-        for file_path in files_data.keys():
-            api_url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
-            response = requests.get(api_url, headers=headers, params={"ref": branch})
-            
-            if response.status_code == 200:
-                file_info[file_path] = response.json()
-            elif response.status_code == 404:
-                # File doesn't exist yet
-                file_info[file_path] = None
-            else:
-                all_success = False
-                results[file_path] = f"Error getting file info: {response.status_code}"
-        
-        # Now update each file with the correct SHA
-        for file_path, data in files_data.items():
-            try:
-                api_url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
-                
-                # Prepare content
-                content = json.dumps(data, indent=2)
-                encoded_content = base64.b64encode(content.encode()).decode()
-                
-                # Create update payload
-                update_data = {
-                    "message": f"Update {file_path} via batch operation",
-                    "content": encoded_content,
-                    "branch": branch
-                }
-                
-                # Add SHA if file exists
-                if file_info[file_path]:
-                    current_sha = file_info[file_path]["sha"]
-                    update_data["sha"] = current_sha
-                    
-                    # Check if content is different
-                    current_content = base64.b64decode(file_info[file_path]["content"]).decode('utf-8')
-                    if current_content.strip() == content.strip():
-                        results[file_path] = "No changes needed"
-                        continue
-                
-                # Update the file
-                update_response = requests.put(api_url, headers=headers, json=update_data)
-                
-                if update_response.status_code in [200, 201]:
-                    results[file_path] = "Success"
-                elif update_response.status_code == 409:
-                    # Handle conflict by getting the latest SHA
-                    retry_response = requests.get(api_url, headers=headers, params={"ref": branch})
-                    if retry_response.status_code == 200:
-                        latest_sha = retry_response.json()["sha"]
-                        update_data["sha"] = latest_sha
-                        
-                        # Try again with the latest SHA
-                        retry_update = requests.put(api_url, headers=headers, json=update_data)
-                        if retry_update.status_code in [200, 201]:
-                            results[file_path] = "Success after conflict resolution"
-                        else:
-                            all_success = False
-                            results[file_path] = f"Failed after conflict: {retry_update.status_code}"
-                    else:
-                        all_success = False
-                        results[file_path] = f"Failed to resolve conflict: {retry_response.status_code}"
-                else:
-                    all_success = False
-                    results[file_path] = f"Failed: {update_response.status_code}"
-                    
-                # Add a small delay between updates to avoid rate limiting
-                time.sleep(1)
-                    
-            except Exception as e:
-                all_success = False
-                results[file_path] = f"Error: {str(e)}"
+        success, status = commit_files(files_data)
         
         # Prepare result message
-        message_parts = [f"{file}: {status}" for file, status in results.items()]
+        message_parts = [f"{file}: {status}" for file in files_data]
         message = "\n".join(message_parts)
         
-        return all_success, message
+        return success, message
         
     except Exception as e:
-        return False, f"Error in batch update: {str(e)}"
\ No newline at end of file
+        return False, f"Error in batch update: {str(e)}"
@@ -1,5 +1,4 @@
-import json
-from core.excel_storage import load_teams_excel
+from core.storage import get_store
 
 def format_currency(amount):
     """Format amount in Indian currency format (Lakhs and Crores)"""
@@ -10,17 +9,53 @@ def format_currency(amount):
     else:
         return f"₹{amount:,}"
 
-def get_leaderboard():
-    # Get data from JSON
-    with open("data/teams.json") as f:
-        teams = json.load(f)
-    
-    # Sort by balance in descending order
-    leaderboard = sorted(teams, key=lambda x: x["balance"], reverse=True)
-    return leaderboard
+def get_leaderboard(limit=None):
+    """
+    Teams sorted by balance in descending order
+
+    Args:
+        limit: Only return the top teams (all teams if None)
+    """
+    store = get_store()
+    with store.lock:
+        # The store keeps the ranking sorted as balances change. Copies, so
+        # callers can't change the store's balances or ranking order.
+        return [dict(team) for team in store.leaderboard.top(limit)]
+
+def get_team_rank(team_name):
+    """1-based leaderboard position of a team, or None if it isn't registered"""
+    store = get_store()
+    with store.lock:
+        return store.leaderboard.rank_of(team_name)
+
+def get_teams_around(team_name, radius=2):
+    """
+    The teams ranked just above and below a team
+
+    Returns:
+        list: (rank, team) pairs, best first; empty if the team isn't registered
+    """
+    store = get_store()
+    with store.lock:
+        rank = store.leaderboard.rank_of(team_name)
+        if rank is None:
+            return []
+        return [(rank, dict(team)) for rank, team in store.leaderboard.around(rank, radius)]
+
+def get_rank_history(team_name):
+    """
+    A team's balance and rank after each settled match, in the order the results came in
+
+    Returns:
+        list: {"match_id", "winner", "balance", "rank"} dicts
+    """
+    store = get_store()
+    with store.lock:
+        return store.balance_history.series(team_name)
 
 def get_leaderboard_excel():
-    # Get data from Excel
+    # Get data from Excel (imported here so pages don't load pandas and openpyxl for it)
+    from core.excel_storage import load_teams_excel
     teams = load_teams_excel()
     
     # Sort by balance in descending order
@@ -0,0 +1,286 @@
+"""
+Recompute team balances from the bet ledger and check them against teams.json
+
+Every team starts the season with STARTING_BALANCE. Placing a bet deducts
+its amount and settling a match credits 4x (home team) or 2x the stake for a
+correct prediction, so a team's balance must equal
+
+    STARTING_BALANCE - sum(amounts) + sum(payouts)
+
+over its bets, with payouts worked out from the match winners. The data
+store keeps the bet fields as NumPy columns (LedgerColumns) and the replay
+runs column-wise over them, so a full check is cheap enough to run after
+every settlement:
+
+    python -m core.ledger            # report discrepancies
+    python -m core.ledger --rebuild  # overwrite balances with the replayed ones
+"""
+import argparse
+import time
+from array import array
+from core.storage import STARTING_BALANCE, get_store
+from core.sync_queue import enqueue_sync, flush_sync
+
+# Bet statuses as replay_ledger codes
+STATUS_CODES = {"pending": 0, "lost": 1, "won": 2}
+
+# NumPy is imported by the functions that replay the ledger, since the data
+# store builds LedgerColumns on every load
+
+
+class LedgerColumns:
+    """
+    The bet fields replay_ledger reads, as typed columns kept up to date by
+    the data store.
+
+    Teams, predictions and statuses are stored as integer codes into name
+    tables that grow as new names turn up. Placing a bet appends a row and
+    settling one overwrites its status and winnings, so a check copies a few
+    flat arrays instead of reading every bet. The columns are stdlib arrays,
+    so the store doesn't need NumPy until a check runs.
+    """
+
+    # Column typecodes and the NumPy dtype each is read back as
+    TYPES = {
+        "match_id": ("q", "int64"),
+        "team": ("i", "intc"),
+        "prediction": ("i", "intc"),
+        "amount": ("q", "int64"),
+        "is_home_team": ("b", "bool"),
+        "status": ("i", "intc"),
+        "winnings": ("q", "int64"),
+    }
+
+    def __init__(self, bets=()):
+        bets = list(bets)
+        # Code of each name, in the order the names were first seen
+        self.codes = {"team": {}, "prediction": {}, "status": {}}
+        # Column by column rather than through _value, as this runs on every load
+        self.columns = {}
+        for name, (typecode, _) in self.TYPES.items():
+            codes = self.codes.get(name)
+            if codes is not None:
+                values = [codes.setdefault(bet[name], len(codes)) for bet in bets]
+            elif name == "winnings":
+                values = [bet.get("winnings") or 0 for bet in bets]
+            else:
+                values = [bet[name] for bet in bets]
+            self.columns[name] = array(typecode, values)
+        self.row_by_key = {(bet["match_id"], bet["team"]): row for row, bet in enumerate(bets)}
+
+    def _value(self, name, bet):
+        if name in self.codes:
+            codes = self.codes[name]
+            code = codes.get(bet[name])
+            if code is None:
+                code = codes[bet[name]] = len(codes)
+            return code
+        if name == "winnings":
+            return bet.get("winnings") or 0
+        return bet[name]
+
+    def add(self, bet):
+        """Append a newly placed bet"""
+        self.row_by_key[(bet["match_id"], bet["team"])] = len(self.columns["match_id"])
+        for name, column in self.columns.items():
+            column.append(self._value(name, bet))
+
+    def settle(self, bet):
+        """Update a bet's status and winnings once it has been settled"""
+        row = self.row_by_key.get((bet["match_id"], bet["team"]))
+        if row is not None:
+            self.columns["status"][row] = self._value("status", bet)
+            self.columns["winnings"][row] = self._value("winnings", bet)
+
+    def snapshot(self):
+        """
+        Copy of the ledger for replay_ledger (caller must hold store.lock)
+
+        Returns:
+            dict: One NumPy array per bet field, plus the name tables "teams",
+                  "predictions" and "statuses" indexed by code
+        """
+        import numpy as np
+        ledger = {
+            name: np.frombuffer(self.columns[name], dtype=typecode).astype(dtype)
+            for name, (typecode, dtype) in self.TYPES.items()
+        }
+        ledger["teams"] = list(self.codes["team"])
+        ledger["predictions"] = list(self.codes["prediction"])
+        ledger["statuses"] = list(self.codes["status"])
+        return ledger
+
+
+def replay_ledger(ledger, team_names, winners, starting_balance=STARTING_BALANCE):
+    """
+    Replay every bet in one vectorized pass
+
+    Args:
+        ledger: Bets from LedgerColumns.snapshot
+        team_names: Team names, in the order of the returned arrays
+        winners: {match_id: winner} for settled matches
+        starting_balance: Bankroll each team starts with
+
+    Returns:
+        dict of NumPy arrays: "balance", "bets", "staked" and "paid" per team,
+        and per bet the expected "status" code (0 pending, 1 lost, 2 won),
+        expected "winnings" and a "mismatch" flag where the recorded bet disagrees
+    """
+    import numpy as np
+    n_teams = len(team_names)
+    # Ledger team codes as positions in team_names, -1 for unknown teams (the
+    # extra last entry keeps the table non-empty)
+    positions = {name: i for i, name in enumerate(team_names)}
+    team_table = np.array([positions.get(name, -1) for name in ledger["teams"]] + [-1], dtype=np.int64)
+    team_codes = team_table[ledger["team"]]
+    amounts = ledger["amount"]
+    match_ids = ledger["match_id"]
+
+    # Winner of each match as a prediction code, in a table indexed by
+    # match_id: -2 while unsettled, -1 if nobody predicted the winner
+    prediction_codes = {name: i for i, name in enumerate(ledger["predictions"])}
+    size = int(max(match_ids.max(initial=0), max(winners, default=0))) + 1
+    winner_by_match = np.full(size, -2, dtype=np.int64)
+    if winners:
+        winner_by_match[np.fromiter(winners, dtype=np.int64, count=len(winners))] = \
+            [prediction_codes.get(winner, -1) for winner in winners.values()]
+    bet_winner = winner_by_match[match_ids]
+
+    settled = bet_winner != -2
+    won = (bet_winner >= 0) & (ledger["prediction"] == bet_winner)
+    multiplier = np.where(ledger["is_home_team"], 4, 2)
+    payouts = np.where(won, amounts * multiplier, 0)
+    status = np.where(won, 2, settled.astype(np.int64))
+
+    # Bets of unknown teams can't affect any balance
+    known = team_codes >= 0
+    codes = team_codes[known]
+    staked = np.bincount(codes, weights=amounts[known], minlength=n_teams).round().astype(np.int64)
+    paid = np.bincount(codes, weights=payouts[known], minlength=n_teams).round().astype(np.int64)
+
+    # Compare with the recorded outcomes, mapping the ledger's status codes to
+    # STATUS_CODES (unknown statuses become -1 and always mismatch)
+    status_table = np.array([STATUS_CODES.get(name, -1) for name in ledger["statuses"]] + [-1])
+    recorded = status_table[ledger["status"]]
+    mismatch = (recorded != status) | (ledger["winnings"] != payouts)
+
+    return {
+        "balance": starting_balance - staked + paid,
+        "bets": np.bincount(codes, minlength=n_teams),
+        "staked": staked,
+        "paid": paid,
+        "status": status,
+        "winnings": payouts,
+        "mismatch": mismatch,
+    }
+
+
+def verify_ledger(store=None, starting_balance=STARTING_BALANCE):
+    """
+    Check every team's balance against a full replay of the bets
+
+    Returns:
+        dict: "ok", per-team rows ("teams"), the teams whose balance differs
+              ("discrepancies"), bets whose recorded outcome doesn't match the
+              match result ("bet_discrepancies") and the time taken ("seconds")
+    """
+    import numpy as np
+    store = store or get_store()
+    start = time.perf_counter()
+    # The store keeps the bets as ledger columns, so this is a few array copies
+    with store.lock:
+        teams = [dict(team) for team in store.teams]
+        winners = {m["match_id"]: m["winner"] for m in store.matches if m.get("winner")}
+        ledger = store.ledger.snapshot()
+
+    team_names = [team["team"] for team in teams]
+    replay = replay_ledger(ledger, team_names, winners, starting_balance)
+
+    rows = []
+    for i, team in enumerate(teams):
+        expected = int(replay["balance"][i])
+        rows.append({
+            "team": team["team"],
+            "balance": team["balance"],
+            "expected": expected,
+            "difference": team["balance"] - expected,
+            "bets": int(replay["bets"][i]),
+            "staked": int(replay["staked"][i]),
+            "paid": int(replay["paid"][i]),
+        })
+
+    status_names = np.array(list(STATUS_CODES))
+    bet_discrepancies = [
+        {
+            "match_id": int(ledger["match_id"][i]),
+            "team": ledger["teams"][ledger["team"][i]],
+            "status": ledger["statuses"][ledger["status"][i]],
+            "winnings": int(ledger["winnings"][i]),
+            "expected_status": str(status_names[replay["status"][i]]),
+            "expected_winnings": int(replay["winnings"][i]),
+        }
+        for i in np.flatnonzero(replay["mismatch"])
+    ]
+    discrepancies = [row for row in rows if row["difference"]]
+
+    return {
+        "ok": not discrepancies and not bet_discrepancies,
+        "starting_balance": starting_balance,
+        "teams": rows,
+        "discrepancies": discrepancies,
+        "bet_discrepancies": bet_discrepancies,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def rebuild_balances(store=None, starting_balance=STARTING_BALANCE):
+    """
+    Overwrite team balances with the ones replayed from the bets
+
+    The corrected balances are written through the storage backend and, for
+    the JSON backend, folded straight into teams.json.
+
+    Returns:
+        dict: {team: (old balance, new balance)} for every team that changed
+    """
+    store = store or get_store()
+    with store.transaction():
+        report = verify_ledger(store, starting_balance)
+        changes = {row["team"]: (row["balance"], row["expected"]) for row in report["discrepancies"]}
+        if changes:
+            store.record_balances({team: new for team, (_, new) in changes.items()})
+    if changes:
+        store.compact()
+        enqueue_sync(["teams"])
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="write the replayed balances to teams.json")
+    parser.add_argument("--starting-balance", type=int, default=STARTING_BALANCE)
+    args = parser.parse_args()
+
+    report = verify_ledger(starting_balance=args.starting_balance)
+    for row in report["teams"]:
+        flag = f"  off by {row['difference']:+,}" if row["difference"] else ""
+        print(f"{row['team']:<35} {row['balance']:>15,} expected {row['expected']:>15,}{flag}")
+    for bet in report["bet_discrepancies"]:
+        print(f"Match {bet['match_id']} / {bet['team']}: recorded {bet['status']} {bet['winnings']:,}, "
+              f"expected {bet['expected_status']} {bet['expected_winnings']:,}")
+    print(f"Checked in {report['seconds'] * 1000:.2f} ms: "
+          + ("ledger OK" if report["ok"] else f"{len(report['discrepancies'])} balance discrepancies"))
+
+    if args.rebuild:
+        changes = rebuild_balances(starting_balance=args.starting_balance)
+        for team, (old, new) in changes.items():
+            print(f"Rebuilt {team}: {old:,} -> {new:,}")
+        if not changes:
+            print("Balances already match the ledger")
+        else:
+            # Let the background sync push teams.json before exiting
+            print(flush_sync(["teams"])[1])
+
+
+if __name__ == "__main__":
+    main()
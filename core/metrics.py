@@ -0,0 +1,124 @@
+"""
+In-process latency histograms for the hot paths
+
+Code is timed in spans named by an operation ("place_bet", "settle",
+"github_sync", ...) and a stage within it ("validate", "write", ...):
+
+    with span("place_bet", "validate"):
+        ...
+
+    @traced("excel_backup")
+    def backup_to_excel(): ...
+
+Every span adds its duration to the histogram of its (operation, stage)
+pair. Histograms use fixed log-spaced buckets, so recording is a bisect
+and a few additions under a lock, memory doesn't grow with the number of
+samples, and percentiles are accurate to within one bucket (about 10%).
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds: 10 microseconds to about 2 minutes, 10% apart
+BUCKET_BOUNDS = []
+_bound = 1e-5
+while _bound < 120:
+    BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.1
+
+
+class LatencyHistogram:
+    """Counts of durations per bucket, plus count, total and extremes"""
+
+    def __init__(self):
+        # The last bucket catches anything above the largest bound
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0 < q <= 100), in seconds"""
+        if not self.count:
+            return None
+        target = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                bound = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return max(min(bound, self.max), self.min)
+        return self.max
+
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def record(operation, stage, seconds):
+    """Add one duration to the histogram of an operation stage"""
+    with _lock:
+        histogram = _histograms.get((operation, stage))
+        if histogram is None:
+            histogram = _histograms[(operation, stage)] = LatencyHistogram()
+        histogram.record(seconds)
+
+
+@contextmanager
+def span(operation, stage="total"):
+    """Time the enclosed block, whether or not it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(operation, stage, time.perf_counter() - start)
+
+
+def traced(operation, stage="total"):
+    """Decorator timing every call of a function as a span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(operation, stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_metrics():
+    """
+    Summary of every histogram, ordered by operation then stage
+
+    Returns:
+        list: dicts with operation, stage, count, total and p50/p95/p99/max (seconds)
+    """
+    with _lock:
+        return [
+            {
+                "operation": operation,
+                "stage": stage,
+                "count": histogram.count,
+                "total": histogram.total,
+                "p50": histogram.percentile(50),
+                "p95": histogram.percentile(95),
+                "p99": histogram.percentile(99),
+                "max": histogram.max,
+            }
+            for (operation, stage), histogram in sorted(_histograms.items())
+        ]
+
+
+def reset_metrics():
+    """Drop every recorded duration"""
+    with _lock:
+        _histograms.clear()
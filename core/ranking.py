@@ -0,0 +1,79 @@
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    """
+    Teams ordered by balance, kept sorted as balances change.
+
+    The order lives in a list of (-balance, position, team name) keys sorted
+    with bisect, so the first entry is the leader and ties keep the order the
+    teams were registered in (like the stable sort this replaces). Rank
+    lookups are a binary search and top-K is a slice; a balance change
+    removes and re-inserts one key instead of re-sorting every team.
+
+    The team dicts are held by reference, so callers change team["balance"]
+    in place and then call update() with the team name.
+    """
+
+    def __init__(self, teams=()):
+        self.teams_by_name = {}
+        self.key_by_team = {}
+        for position, team in enumerate(teams):
+            self.teams_by_name[team["team"]] = team
+            self.key_by_team[team["team"]] = (-team["balance"], position, team["team"])
+        self.keys = sorted(self.key_by_team.values())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, team):
+        """Start ranking a newly registered team"""
+        if team["team"] in self.key_by_team:
+            self.update(team["team"])
+            return
+        key = (-team["balance"], len(self.key_by_team), team["team"])
+        self.teams_by_name[team["team"]] = team
+        self.key_by_team[team["team"]] = key
+        insort(self.keys, key)
+
+    def update(self, team_name):
+        """Move a team to the place matching its current balance"""
+        old_key = self.key_by_team.get(team_name)
+        if old_key is None:
+            return
+        balance = self.teams_by_name[team_name]["balance"]
+        if -old_key[0] == balance:
+            return
+        del self.keys[bisect_left(self.keys, old_key)]
+        new_key = (-balance, old_key[1], team_name)
+        self.key_by_team[team_name] = new_key
+        insort(self.keys, new_key)
+
+    def top(self, k=None):
+        """The k highest balances (every team if k is None), best first"""
+        keys = self.keys if k is None else self.keys[:k]
+        return [self.teams_by_name[key[2]] for key in keys]
+
+    def rank_of(self, team_name):
+        """1-based rank of a team, or None if it isn't registered"""
+        key = self.key_by_team.get(team_name)
+        if key is None:
+            return None
+        return bisect_left(self.keys, key) + 1
+
+    def at_rank(self, rank):
+        """Team at a 1-based rank, or None"""
+        if not 1 <= rank <= len(self.keys):
+            return None
+        return self.teams_by_name[self.keys[rank - 1][2]]
+
+    def around(self, rank, radius=2):
+        """
+        Teams ranked within radius places of a rank
+
+        Returns:
+            list: (rank, team) pairs, best first
+        """
+        start = max(rank - radius, 1)
+        end = min(rank + radius, len(self.keys))
+        return [(r, self.teams_by_name[self.keys[r - 1][2]]) for r in range(start, end + 1)]
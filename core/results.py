@@ -1,79 +1,42 @@
-import json
-from core.excel_storage import backup_to_excel
-from core.github_storage import update_json_file
+from core.metrics import traced
+from core.settlement import SettlementError, settle_match, settle_matches
 
+@traced("update_result")
 def update_result(match_id, winner):
-    # Validate winner is not empty
-    if not winner or winner.strip() == "":
-        return "Winner team name cannot be empty."
-    
+    """
+    Record a match result and settle its bets
+
+    Returns:
+        str: Status message for the admin page. Use core.settlement.settle_match
+             for the full settlement report.
+    """
     try:
-        # Load data from JSON
-        with open("data/matches.json") as f:
-            matches = json.load(f)
-        
-        # Handle empty or invalid bets.json file
-        try:
-            with open("data/bets.json") as f:
-                bets = json.load(f)
-        except json.JSONDecodeError:
-            bets = []
-            
-        with open("data/teams.json") as f:
-            teams = json.load(f)
+        settle_match(match_id, winner)
+        return f"Match {match_id} result updated. Winner: {winner}"
 
-        match = next((m for m in matches if m["match_id"] == match_id), None)
-        if not match:
-            return f"Match ID {match_id} not found."
-            
-        # Validate winner is one of the teams in the match
-        if winner not in [match["team1"], match["team2"]]:
-            return f"Winner must be either {match['team1']} or {match['team2']}."
+    except SettlementError as e:
+        return str(e)
+    except Exception as e:
+        return f"Error updating result: {str(e)}"
 
-        match["winner"] = winner
+@traced("update_results")
+def update_results(results):
+    """
+    Record several match results with one commit and one sync
 
-        # Process bets
-        for bet in bets:
-            if bet["match_id"] == match_id and bet["status"] == "pending":
-                team = next((t for t in teams if t["team"] == bet["team"]), None)
-                if not team:
-                    continue  # Skip if team not found
-                    
-                if bet["prediction"] == winner:
-                    # If the prediction is correct:
-                    # For home team: Add 4x bet amount to balance
-                    # For non-home team: Add 2x bet amount to balance
-                    multiplier = 4 if bet["is_home_team"] else 2
-                    winnings = bet["amount"] * multiplier
-                    bet["status"] = "won"
-                    bet["winnings"] = winnings
-                    
-                    # Add winnings to team balance
-                    # Since we already deducted the bet amount when placing the bet,
-                    # we need to add the full winnings amount
-                    team["balance"] += winnings
-                else:
-                    bet["status"] = "lost"
-                    bet["winnings"] = 0
-                    # No need to deduct the bet amount again as it was already deducted when placing the bet
+    Args:
+        results: List of (match_id, winner) pairs
 
-        # Save updated data to JSON
-        with open("data/matches.json", "w") as f:
-            json.dump(matches, f, indent=2)
-        with open("data/bets.json", "w") as f:
-            json.dump(bets, f, indent=2)
-        with open("data/teams.json", "w") as f:
-            json.dump(teams, f, indent=2)
-        
-        # Update GitHub repository
-        update_json_file("data/matches.json", matches)
-        update_json_file("data/bets.json", bets)
-        update_json_file("data/teams.json", teams)
-        
-        # Backup to Excel
-        backup_to_excel()
+    Returns:
+        str: Status message for the admin page. Nothing is recorded if any result is invalid.
+    """
+    try:
+        reports = settle_matches(results)
+        if not reports:
+            return "No results to update."
+        return "Results updated: " + ", ".join(f"Match {r['match_id']} ({r['winner']})" for r in reports)
 
-        return f"Match {match_id} result updated. Winner: {winner}"
-        
+    except SettlementError as e:
+        return str(e)
     except Exception as e:
-        return f"Error updating result: {str(e)}"
\ No newline at end of file
+        return f"Error updating results: {str(e)}"
@@ -0,0 +1,203 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from core.metrics import span, traced
+from core.storage import get_store
+from core.sync_queue import enqueue_sync
+
+
+class SettlementError(ValueError):
+    """Raised when a match result can't be recorded; the message is shown to the admin"""
+
+
+def bet_outcome(bet, winner):
+    """
+    Outcome of a single pending bet once the match winner is known
+
+    Returns:
+        tuple: (status, winnings)
+    """
+    if bet["prediction"] == winner:
+        # If the prediction is correct:
+        # For home team: Add 4x bet amount to balance
+        # For non-home team: Add 2x bet amount to balance
+        # Since we already deducted the bet amount when placing the bet,
+        # the full winnings amount is added to the team balance
+        multiplier = 4 if bet["is_home_team"] else 2
+        return "won", bet["amount"] * multiplier
+    # No need to deduct the bet amount again as it was already deducted when placing the bet
+    return "lost", 0
+
+
+def validate_result(store, match_id, winner):
+    """Check a result against the store (caller must hold store.lock); returns the match"""
+    # Validate winner is not empty
+    if not winner or winner.strip() == "":
+        raise SettlementError("Winner team name cannot be empty.")
+
+    match = store.get_match(match_id)
+    if not match:
+        raise SettlementError(f"Match ID {match_id} not found.")
+
+    # Settling again would flip the winner without reversing the earlier
+    # payouts, and overwrite the match's balance snapshot
+    if match.get("winner"):
+        raise SettlementError(f"Match {match_id} already has a result ({match['winner']}).")
+
+    # Validate winner is one of the teams in the match
+    if winner not in [match["team1"], match["team2"]]:
+        raise SettlementError(f"Winner must be either {match['team1']} or {match['team2']}.")
+    return match
+
+
+def plan_settlements(store, results):
+    """
+    Work out the outcome of every pending bet of the given matches (caller must hold store.lock)
+
+    Only the matches' own pending bets are visited, through the store's
+    pending-by-match index, and the outcomes are computed column-wise over all
+    of them at once: won/lost from prediction == winner, winnings from the
+    home/away multiplier, and each team's running balance across the batch.
+
+    Args:
+        store: The data store
+        results: List of (match_id, winner) pairs, already validated
+
+    Returns:
+        tuple: (settlements for store.record_settlements, report rows per match_id)
+    """
+    winners = dict(results)
+    bets = [
+        bet for match_id, _ in results for bet in store.get_pending_bets(match_id)
+        if store.get_team(bet["team"])  # Skip if team not found
+    ]
+    rows_by_match = {match_id: [] for match_id in winners}
+    if not bets:
+        return [(match_id, winner, []) for match_id, winner in results], rows_by_match
+
+    df = pd.DataFrame(bets, columns=["match_id", "team", "prediction", "amount", "is_home_team"])
+    won = (df["prediction"] == df["match_id"].map(winners)).to_numpy()
+    # Winners get 4x their stake on their home team and 2x otherwise. Losers
+    # get nothing: the stake was already deducted when the bet was placed.
+    multiplier = np.where(df["is_home_team"].astype(bool).to_numpy(), 4, 2)
+    df["status"] = np.where(won, "won", "lost")
+    df["winnings"] = np.where(won, df["amount"].to_numpy() * multiplier, 0)
+    df["balance_delta"] = df["winnings"]
+    df["net"] = df["winnings"] - df["amount"]
+    # Matches are settled in the order given, so a team's later bets start
+    # from the balance its earlier ones left behind
+    start = df["team"].map(lambda team: store.get_team(team)["balance"])
+    df["balance_after"] = start + df.groupby("team")["winnings"].cumsum()
+    df["balance_before"] = df["balance_after"] - df["winnings"]
+
+    for row in df.to_dict("records"):
+        rows_by_match[row["match_id"]].append({
+            "team": row["team"],
+            "prediction": row["prediction"],
+            "amount": int(row["amount"]),
+            "is_home_team": bool(row["is_home_team"]),
+            "status": row["status"],
+            "winnings": int(row["winnings"]),
+            # Balance change caused by the settlement itself
+            "balance_delta": int(row["balance_delta"]),
+            # Profit or loss on the bet as a whole
+            "net": int(row["net"]),
+            "balance_before": int(row["balance_before"]),
+            "balance_after": int(row["balance_after"]),
+        })
+
+    settlements = [
+        (match_id, winner, [
+            {"team": row["team"], "status": row["status"], "winnings": row["winnings"]}
+            for row in rows_by_match[match_id]
+        ])
+        for match_id, winner in results
+    ]
+    return settlements, rows_by_match
+
+
+def settlement_report(match_id, winner, rows):
+    """Summarise a settled match"""
+    return {
+        "match_id": match_id,
+        "winner": winner,
+        "settled_at": datetime.now().isoformat(),
+        "bets": rows,
+        "deltas": {row["team"]: row["balance_delta"] for row in rows},
+        "winners": sorted(row["team"] for row in rows if row["status"] == "won"),
+        "losers": sorted(row["team"] for row in rows if row["status"] == "lost"),
+        "total_staked": sum(row["amount"] for row in rows),
+        "total_paid": sum(row["winnings"] for row in rows),
+    }
+
+
+@traced("settle")
+def settle_matches(results):
+    """
+    Record several match results at once
+
+    Every result is validated first and nothing is recorded unless all of them
+    are valid. The settlements are then written with a single backend commit
+    and a single background sync.
+
+    Args:
+        results: List of (match_id, winner) pairs
+
+    Returns:
+        list: One settlement report (see settle_match) per match, in the order given
+
+    Raises:
+        SettlementError: If any match or winner is invalid, listing every problem
+    """
+    store = get_store()
+    results = list(results)
+    if not results:
+        return []
+
+    with store.transaction():
+        with span("settle", "validate"):
+            errors = []
+            seen = set()
+            for match_id, winner in results:
+                if match_id in seen:
+                    errors.append(f"Match {match_id} is listed more than once.")
+                    continue
+                seen.add(match_id)
+                try:
+                    validate_result(store, match_id, winner)
+                except SettlementError as e:
+                    errors.append(str(e))
+        if errors:
+            raise SettlementError("\n".join(errors))
+
+        with span("settle", "plan"):
+            settlements, rows_by_match = plan_settlements(store, results)
+
+        # Record the winners, bet outcomes and balance credits in the local journal
+        with span("settle", "write"):
+            store.record_settlements(settlements)
+
+    # GitHub sync and Excel backup run in the background
+    with span("settle", "enqueue_sync"):
+        enqueue_sync(["matches", "bets", "teams"])
+
+    with span("settle", "report"):
+        return [settlement_report(match_id, winner, rows_by_match[match_id]) for match_id, winner in results]
+
+
+def settle_match(match_id, winner):
+    """
+    Record a match result and settle its pending bets
+
+    Args:
+        match_id: The match to settle
+        winner: The winning team, one of the match's two teams
+
+    Returns:
+        dict: Settlement report with the per-bet outcomes ("bets"), balance change
+              per team ("deltas") and the totals staked and paid out
+
+    Raises:
+        SettlementError: If the match or winner is invalid
+    """
+    return settle_matches([(match_id, winner)])[0]
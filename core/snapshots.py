@@ -0,0 +1,103 @@
+"""
+Each team's balance and rank after every settled match
+
+The settlement path appends one row per settled match, so the rank and
+balance history of a team is a single pass over the settled matches instead
+of a replay of every bet. Balances here count a team's open bets back in:
+a stake on a match that hasn't been played yet isn't a loss, so ranks only
+move when results come in.
+"""
+
+
+class BalanceHistory:
+    """
+    Ordered per-match snapshot rows:
+
+        {"match_id": 12, "winner": "CSK", "balances": {team: balance}, "ranks": {team: rank}}
+    """
+
+    def __init__(self, rows=()):
+        self.rows = []
+        self.position_by_match = {}
+        for row in rows:
+            self._put(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, match_id):
+        return match_id in self.position_by_match
+
+    def _put(self, row):
+        position = self.position_by_match.get(row["match_id"])
+        if position is None:
+            self.position_by_match[row["match_id"]] = len(self.rows)
+            self.rows.append(row)
+        else:
+            # A corrected result replaces the match's snapshot in place
+            self.rows[position] = row
+
+    def record(self, match_id, winner, balances):
+        """
+        Snapshot the standings right after a match was settled
+
+        Args:
+            match_id: The settled match
+            winner: Its winner
+            balances: {team: balance} in registration order, which breaks ties
+
+        Returns:
+            dict: The new row
+        """
+        order = sorted(enumerate(balances.items()), key=lambda item: (-item[1][1], item[0]))
+        row = {
+            "match_id": match_id,
+            "winner": winner,
+            "balances": dict(balances),
+            "ranks": {team: rank for rank, (_, (team, _)) in enumerate(order, start=1)},
+        }
+        self._put(row)
+        return row
+
+    def series(self, team_name):
+        """
+        Balance and rank of one team after every settled match, in settlement order
+
+        Returns:
+            list: {"match_id", "winner", "balance", "rank"} dicts
+        """
+        return [
+            {
+                "match_id": row["match_id"],
+                "winner": row["winner"],
+                "balance": row["balances"][team_name],
+                "rank": row["ranks"][team_name],
+            }
+            for row in self.rows if team_name in row["balances"]
+        ]
+
+
+def replay_history(teams, matches, bets, starting_balance):
+    """
+    Rebuild the snapshot rows of every settled match from the bets
+
+    Used when no history has been recorded yet (or it doesn't cover every
+    settled match). Matches are taken in date order, and each team's
+    balance is its starting balance plus the net result of its settled bets.
+
+    Returns:
+        BalanceHistory
+    """
+    bets_by_match = {}
+    for bet in bets:
+        bets_by_match.setdefault(bet["match_id"], []).append(bet)
+
+    balances = {team["team"]: starting_balance for team in teams}
+    history = BalanceHistory()
+    settled = sorted((m for m in matches if m.get("winner")), key=lambda m: (m.get("date") or "", m["match_id"]))
+    for match in settled:
+        for bet in bets_by_match.get(match["match_id"], []):
+            if bet["team"] in balances:
+                balances[bet["team"]] += bet["winnings"] - bet["amount"]
+        history.record(match["match_id"], match["winner"], balances)
+    return history
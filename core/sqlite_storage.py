@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from core.storage import DATA_DIR, DataStore, JsonBackend, _apply_event, file_lock
+
+# SQLite database file used when SPL_STORAGE_BACKEND=sqlite
+SQLITE_PATH = os.environ.get("SPL_SQLITE_PATH", os.path.join(DATA_DIR, "spl.db"))
+# Events kept in the events table; a process further behind reloads everything
+EVENT_KEEP = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS teams (
+    team TEXT PRIMARY KEY,
+    home_team TEXT,
+    balance INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY,
+    date TEXT,
+    team1 TEXT,
+    team2 TEXT,
+    venue TEXT,
+    winner TEXT
+);
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_id INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    prediction TEXT,
+    amount INTEGER NOT NULL,
+    is_home_team INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    winnings INTEGER NOT NULL DEFAULT 0,
+    timestamp TEXT,
+    UNIQUE (match_id, team)
+);
+CREATE TABLE IF NOT EXISTS balance_history (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_id INTEGER NOT NULL UNIQUE,
+    row TEXT NOT NULL
+);
+-- Every change as a JSON event, in the journal's format, so other server
+-- processes can apply just the changes they missed
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bets_match_id ON bets (match_id);
+CREATE INDEX IF NOT EXISTS idx_bets_team ON bets (team);
+"""
+
+TEAM_COLUMNS = ["team", "home_team", "balance"]
+MATCH_COLUMNS = ["match_id", "date", "team1", "team2", "venue", "winner"]
+BET_COLUMNS = ["match_id", "team", "prediction", "amount", "is_home_team", "status", "winnings", "timestamp"]
+
+
+def connect(db_path=SQLITE_PATH):
+    """Open a connection in WAL mode so readers never block the writer"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _insert_all(conn, teams, matches, bets):
+    conn.executemany(
+        "INSERT INTO teams (team, home_team, balance) VALUES (?, ?, ?)",
+        [(t["team"], t.get("home_team"), t["balance"]) for t in teams],
+    )
+    conn.executemany(
+        "INSERT INTO matches (match_id, date, team1, team2, venue, winner) VALUES (?, ?, ?, ?, ?, ?)",
+        [tuple(m.get(c) for c in MATCH_COLUMNS) for m in matches],
+    )
+    conn.executemany(
+        f"INSERT INTO bets ({', '.join(BET_COLUMNS)}) VALUES ({', '.join('?' for _ in BET_COLUMNS)})",
+        [tuple(b.get(c) for c in BET_COLUMNS) for b in bets],
+    )
+
+
+def migrate_from_json(data_dir=DATA_DIR, db_path=SQLITE_PATH):
+    """
+    One-shot migration of data/*.json (including any journal) into SQLite
+
+    Returns:
+        bool: True if data was migrated, False if the database already had data
+    """
+    conn = connect(db_path)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM teams").fetchone()[0]:
+            return False
+
+        # Reuse the JSON backend so pending journal events are included
+        store = DataStore(JsonBackend(data_dir))
+        with conn:
+            _insert_all(conn, store.teams, store.matches, store.bets)
+        return True
+    finally:
+        conn.close()
+
+
+class SqliteBackend:
+    """
+    Persists data in a SQLite database, one transaction per commit
+
+    Server processes sharing the database serialise their writes on an fcntl
+    lock next to it. Each commit also logs its change to the events table,
+    numbered like the JSON journal. When SQLite's data_version shows another
+    process has committed, only the events after the last one applied are
+    read and replayed into the store.
+    """
+
+    def __init__(self, db_path=SQLITE_PATH, data_dir=DATA_DIR):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.conn = None
+        self.data_version = None
+        # Sequence number of the last event reflected in memory
+        self.seq = 0
+        self.write_depth = 0
+
+    @property
+    def write_lock_path(self):
+        return f"{self.db_path}.lock"
+
+    @contextmanager
+    def _read_transaction(self):
+        """Run several SELECTs against one consistent snapshot of the database"""
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self.conn.commit()
+
+    def load(self, store):
+        """Load all rows into the store, migrating from JSON on first use"""
+        if self.conn is None:
+            # Only one process migrates
+            with file_lock(self.write_lock_path):
+                migrate_from_json(self.data_dir, self.db_path)
+            self.conn = connect(self.db_path)
+
+        with self._read_transaction():
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+            teams = [dict(zip(TEAM_COLUMNS, row)) for row in self.conn.execute(
+                f"SELECT {', '.join(TEAM_COLUMNS)} FROM teams")]
+            matches = [dict(zip(MATCH_COLUMNS, row)) for row in self.conn.execute(
+                f"SELECT {', '.join(MATCH_COLUMNS)} FROM matches ORDER BY match_id")]
+            bets = []
+            for row in self.conn.execute(f"SELECT {', '.join(BET_COLUMNS)} FROM bets ORDER BY id"):
+                bet = dict(zip(BET_COLUMNS, row))
+                bet["is_home_team"] = bool(bet["is_home_team"])
+                bets.append(bet)
+            history = [json.loads(row) for (row,) in self.conn.execute(
+                "SELECT row FROM balance_history ORDER BY position")]
+        store.reset(teams, matches, bets, history)
+
+        # Save the history if the store had to rebuild it from the bets
+        if store.balance_history.rows != history:
+            with self.conn:
+                self.conn.execute("DELETE FROM balance_history")
+            self.append_history(store.balance_history.rows)
+
+    def refresh(self, store):
+        """Apply changes other processes committed since the last check (caller must hold store.lock)"""
+        if self.conn.execute("PRAGMA data_version").fetchone()[0] == self.data_version:
+            return
+        with self._read_transaction():
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            events = self.conn.execute(
+                "SELECT seq, event FROM events WHERE seq > ? ORDER BY seq", (self.seq,)).fetchall()
+        if events and events[0][0] != self.seq + 1:
+            # The events we missed have been trimmed
+            store.load()
+            return
+        for seq, event in events:
+            _apply_event(store, json.loads(event))
+            self.seq = seq
+        self.data_version = data_version
+
+    @contextmanager
+    def write_lock(self, store):
+        """Hold the cross-process write lock with the store caught up (caller must hold store.lock)"""
+        if self.write_depth:
+            self.write_depth += 1
+            try:
+                yield
+            finally:
+                self.write_depth -= 1
+            return
+
+        with file_lock(self.write_lock_path):
+            self.write_depth = 1
+            try:
+                self.refresh(store)
+                yield
+            finally:
+                self.write_depth = 0
+
+    def _log_events(self, events):
+        """
+        Add events to the events table inside the caller's transaction (caller
+        must hold write_lock); returns the sequence number of the last one
+        """
+        seq = self.seq + len(events)
+        # Numbered explicitly, so a commit based on stale data fails on the
+        # primary key instead of skipping another process's events
+        self.conn.executemany(
+            "INSERT INTO events (seq, event) VALUES (?, ?)",
+            [(self.seq + i, json.dumps(event)) for i, event in enumerate(events, start=1)],
+        )
+        self.conn.execute("DELETE FROM events WHERE seq <= ?", (seq - EVENT_KEEP,))
+        return seq
+
+    def append_bets(self, bets):
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO bets ({', '.join(BET_COLUMNS)}) VALUES ({', '.join('?' for _ in BET_COLUMNS)})",
+                [tuple(bet[c] for c in BET_COLUMNS) for bet in bets],
+            )
+            self.conn.executemany(
+                "UPDATE teams SET balance = balance - ? WHERE team = ?",
+                [(bet["amount"], bet["team"]) for bet in bets],
+            )
+            seq = self._log_events([{"event": "bet", "bet": bet} for bet in bets])
+        self.seq = seq
+
+    def append_settlement(self, match_id, winner, outcomes):
+        self.append_settlements([(match_id, winner, outcomes)])
+
+    def append_settlements(self, settlements):
+        # One transaction for every match in the batch
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE matches SET winner = ? WHERE match_id = ?",
+                [(winner, match_id) for match_id, winner, _ in settlements],
+            )
+            self.conn.executemany(
+                "UPDATE bets SET status = ?, winnings = ? WHERE match_id = ? AND team = ?",
+                [(o["status"], o["winnings"], match_id, o["team"])
+                 for match_id, _, outcomes in settlements for o in outcomes],
+            )
+            self.conn.executemany(
+                "UPDATE teams SET balance = balance + ? WHERE team = ?",
+                [(o["winnings"], o["team"])
+                 for _, _, outcomes in settlements for o in outcomes if o["winnings"]],
+            )
+            seq = self._log_events([
+                {"event": "settle", "match_id": match_id, "winner": winner, "outcomes": outcomes}
+                for match_id, winner, outcomes in settlements
+            ])
+        self.seq = seq
+
+    def set_balances(self, balances):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE teams SET balance = ? WHERE team = ?",
+                [(balance, team) for team, balance in balances.items()],
+            )
+            seq = self._log_events([{"event": "balances", "balances": balances}])
+        self.seq = seq
+
+    def append_history(self, rows):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO balance_history (match_id, row) VALUES (?, ?) "
+                "ON CONFLICT (match_id) DO UPDATE SET row = excluded.row",
+                [(row["match_id"], json.dumps(row)) for row in rows],
+            )
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, store, if_needed=False):
+        """Checkpoint the WAL back into the main database file"""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+if __name__ == "__main__":
+    if migrate_from_json():
+        print(f"Migrated {DATA_DIR}/*.json into {SQLITE_PATH}")
+    else:
+        print(f"{SQLITE_PATH} already contains data, nothing to migrate")
@@ -0,0 +1,693 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from core.metrics import record, span
+from core.ranking import Leaderboard
+from core.snapshots import BalanceHistory, replay_history
+
+# Directory holding teams.json, matches.json and bets.json
+DATA_DIR = os.environ.get("SPL_DATA_DIR", "data")
+
+# Storage backend: "json" (snapshot files + journal) or "sqlite"
+STORAGE_BACKEND = os.environ.get("SPL_STORAGE_BACKEND", "json")
+
+# Dataset name -> file name (inside DATA_DIR locally, under data/ on GitHub)
+DATASETS = {
+    "teams": "teams.json",
+    "matches": "matches.json",
+    "bets": "bets.json",
+}
+
+# Balance and rank of every team after each settled match (see core/snapshots.py)
+HISTORY_FILE = "balance_history.json"
+
+# Bankroll every team starts the season with (10 Crore)
+STARTING_BALANCE = 100000000
+
+# Append-only log of bet and settlement events applied on top of the JSON snapshot
+JOURNAL_FILE = "journal.jsonl"
+# Sequence number of the last journal event folded into the JSON snapshot
+SNAPSHOT_META_FILE = ".snapshot.json"
+# Compact the journal into the snapshot once it grows past this many bytes
+COMPACT_THRESHOLD = int(os.environ.get("SPL_JOURNAL_COMPACT_BYTES", 256 * 1024))
+# fcntl lock files coordinating server processes that share DATA_DIR: one held
+# while validating and appending a write, one while a snapshot is being written
+WRITE_LOCK_FILE = ".write.lock"
+SNAPSHOT_LOCK_FILE = ".snapshot.lock"
+# Held for a whole compaction, so only one process compacts at a time
+COMPACT_LOCK_FILE = ".compact.lock"
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): only a single server process is safe
+    fcntl = None
+
+
+def _read_json(path, default):
+    """Read a JSON file, falling back to a default for missing or empty files"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def _atomic_write(path, content):
+    """Write a file through a temporary file and rename, so readers never see half a file"""
+    # Unique per process and thread, so concurrent writers never share a temporary file
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _lock_file(path, exclusive=True, blocking=True):
+    """
+    Open a lock file and take an fcntl lock on it; returns the file to pass to _unlock_file
+
+    With blocking=False, raises BlockingIOError if another holder has it.
+    """
+    if fcntl is None:
+        return None
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def _unlock_file(f):
+    if f is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+@contextmanager
+def file_lock(path, exclusive=True):
+    """
+    Hold an fcntl advisory lock on a file
+
+    Each call locks through its own open file, so threads of one process
+    exclude each other just like separate processes do.
+    """
+    f = _lock_file(path, exclusive)
+    try:
+        yield
+    finally:
+        _unlock_file(f)
+
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class _JournalGap(Exception):
+    """The journal no longer holds every event after the ones applied in memory"""
+
+
+def _apply_event(store, event):
+    """Apply one logged bet, settlement or balance event to the store"""
+    if event["event"] == "bet":
+        store.apply_bet(event["bet"])
+    elif event["event"] == "settle":
+        store.apply_settlement(event["match_id"], event["winner"], event["outcomes"])
+    elif event["event"] == "balances":
+        store.apply_balances(event["balances"])
+
+
+class JsonBackend:
+    """
+    Persists data as the JSON snapshot files plus an append-only journal.
+
+    Bets and settlements are appended to the journal as one-line events; the
+    JSON files are only rewritten when the journal is compacted.
+
+    Several server processes can share the data directory. Every write
+    takes WRITE_LOCK_FILE, first applies the journal events other processes
+    appended since this one last looked, and then validates and appends
+    under the same lock, so sequence numbers stay unique and no two
+    processes accept conflicting bets. Readers notice changes by the size
+    and mtime of the journal and snapshot files, and only read the journal
+    bytes they haven't seen yet. The snapshot's sequence number acts as its
+    generation: the JSON files are only parsed again when another process
+    compacted events this one never saw.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.seq = 0
+        # Bytes of the current journal applied so far, and which file that was
+        self.journal_size = 0
+        self.journal_id = None
+        # Stat of the snapshot metadata and journal when last caught up
+        self.stamp = None
+        self.write_depth = 0
+
+    def path(self, dataset):
+        """Local file path of a dataset ('teams', 'matches' or 'bets')"""
+        return os.path.join(self.data_dir, DATASETS[dataset])
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.data_dir, JOURNAL_FILE)
+
+    @property
+    def snapshot_meta_path(self):
+        return os.path.join(self.data_dir, SNAPSHOT_META_FILE)
+
+    @property
+    def history_path(self):
+        return os.path.join(self.data_dir, HISTORY_FILE)
+
+    @property
+    def write_lock_path(self):
+        return os.path.join(self.data_dir, WRITE_LOCK_FILE)
+
+    @property
+    def snapshot_lock_path(self):
+        return os.path.join(self.data_dir, SNAPSHOT_LOCK_FILE)
+
+    @property
+    def compact_lock_path(self):
+        return os.path.join(self.data_dir, COMPACT_LOCK_FILE)
+
+    def _stamp(self):
+        return _file_stat(self.snapshot_meta_path), _file_stat(self.journal_path)
+
+    def load(self, store):
+        """Load the JSON snapshot into the store and replay the journal on top of it"""
+        # Taken before reading, so a change made meanwhile is caught by the next refresh
+        self.stamp = self._stamp()
+        # Not while another process is writing the snapshot files
+        with file_lock(self.snapshot_lock_path, exclusive=False):
+            self._load_snapshot(store)
+            self.journal_id = (_file_stat(self.journal_path) or (None,))[0]
+            self.journal_size = self._replay_journal(self.journal_path, store)
+
+    def _load_snapshot(self, store):
+        """Load the JSON files, then any journal rotated out by a compaction that hasn't finished"""
+        store.reset(
+            _read_json(self.path("teams"), []),
+            _read_json(self.path("matches"), []),
+            _read_json(self.path("bets"), []),
+            _read_json(self.history_path, []),
+        )
+        self.seq = _read_json(self.snapshot_meta_path, {}).get("seq", 0)
+        self._replay_journal(f"{self.journal_path}.old", store)
+
+    def _replay_journal(self, path, store, offset=0, strict=False):
+        """
+        Apply journal events newer than the snapshot, starting at a byte offset
+
+        Args:
+            strict: Raise _JournalGap unless the events continue exactly where
+                    the store left off (used when catching up on other processes)
+
+        Returns:
+            int: Offset just past the last complete event
+        """
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return offset
+
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write, or another process is mid-append
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    if strict:
+                        raise _JournalGap()
+                    break  # Torn write at the end of the journal
+                offset += len(line)
+                if event["seq"] <= self.seq and not strict:
+                    continue
+                if strict and event["seq"] != self.seq + 1:
+                    raise _JournalGap()
+                _apply_event(store, event)
+                self.seq = event["seq"]
+        return offset
+
+    def refresh(self, store):
+        """
+        Apply what other processes wrote since the last call (caller must hold store.lock)
+
+        Costs two stat calls when nothing changed. Otherwise only the new
+        journal events are read, and the snapshot is reloaded only if a
+        compaction by another process folded away events this store hasn't
+        applied yet.
+        """
+        stamp = self._stamp()
+        if stamp == self.stamp:
+            return
+        self.stamp = stamp
+        with span("store", "refresh"):
+            try:
+                self._catch_up(store)
+            except _JournalGap:
+                store.load()
+
+    def _catch_up(self, store):
+        stat = _file_stat(self.journal_path)
+        journal_id = stat[0] if stat else None
+        if self.journal_id is not None and (journal_id != self.journal_id or stat[1] < self.journal_size):
+            # A compaction rotated out the journal we were reading: finish it
+            # if it is still there, then start on the new one
+            old_path = f"{self.journal_path}.old"
+            if (_file_stat(old_path) or (None,))[0] == self.journal_id:
+                self._replay_journal(old_path, store, self.journal_size, strict=True)
+            self.journal_id, self.journal_size = None, 0
+        if journal_id is not None:
+            self.journal_size = self._replay_journal(self.journal_path, store, self.journal_size, strict=True)
+            self.journal_id = journal_id
+
+        # Events we never read that are now only in the snapshot
+        if _read_json(self.snapshot_meta_path, {}).get("seq", 0) > self.seq:
+            raise _JournalGap()
+
+    @contextmanager
+    def write_lock(self, store):
+        """
+        Hold the cross-process write lock with the store caught up (caller must hold store.lock)
+
+        Re-entrant within the thread holding store.lock.
+        """
+        if self.write_depth:
+            self.write_depth += 1
+            try:
+                yield
+            finally:
+                self.write_depth -= 1
+            return
+
+        start = time.perf_counter()
+        f = _lock_file(self.write_lock_path)
+        record("store", "write_lock_wait", time.perf_counter() - start)
+        self.write_depth = 1
+        try:
+            self.refresh(store)
+            yield
+        finally:
+            self.write_depth = 0
+            _unlock_file(f)
+
+    def append_bets(self, bets):
+        self._append_events([{"event": "bet", "bet": bet} for bet in bets])
+
+    def append_settlement(self, match_id, winner, outcomes):
+        self.append_settlements([(match_id, winner, outcomes)])
+
+    def append_settlements(self, settlements):
+        self._append_events([
+            {"event": "settle", "match_id": match_id, "winner": winner, "outcomes": outcomes}
+            for match_id, winner, outcomes in settlements
+        ])
+
+    def set_balances(self, balances):
+        self._append_events([{"event": "balances", "balances": balances}])
+
+    def append_history(self, rows):
+        # Replaying the journal re-creates these rows; compaction saves them
+        pass
+
+    def _append_events(self, events):
+        """Append events to the journal with a single write and fsync (caller must hold write_lock)"""
+        lines = []
+        for i, event in enumerate(events, start=1):
+            event["seq"] = self.seq + i
+            lines.append(json.dumps(event) + "\n")
+        data = "".join(lines).encode()
+        with open(self.journal_path, "ab") as f:
+            # Drop a torn event left by a process that died mid-write, so the
+            # new events don't get glued onto it
+            if self.journal_id == os.fstat(f.fileno()).st_ino and f.tell() > self.journal_size:
+                f.truncate(self.journal_size)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self.journal_id = os.fstat(f.fileno()).st_ino
+        self.seq += len(events)
+        self.journal_size += len(data)
+
+    def needs_compaction(self):
+        return self.journal_size >= COMPACT_THRESHOLD
+
+    def compact(self, store, if_needed=False):
+        """
+        Fold the journal into the JSON snapshot files.
+
+        Only the journal rotation happens under the write lock: new events
+        keep appending to a fresh file while the next snapshot is built,
+        without touching the live store, from the previous snapshot plus the
+        rotated-out journal. The snapshot lock is only taken to write the
+        files, so other processes keep catching up from the rotated journal
+        meanwhile. The snapshot records the last sequence number it contains,
+        so replaying a leftover journal after a crash never applies an event
+        twice.
+
+        Args:
+            if_needed: Skip it if the journal is below the compaction threshold
+                       once caught up (another process may have just compacted)
+        """
+        # Waits for a compaction by another process to finish
+        with file_lock(self.compact_lock_path):
+            with store.lock, self.write_lock(store):
+                if if_needed and not self.needs_compaction():
+                    return
+                seq = self.seq
+                self._rotate_journal()
+                self.journal_id, self.journal_size = None, 0
+
+            snapshot = DataStore(_CompactionBackend(self.data_dir))
+            if snapshot.backend.seq != seq:
+                # Events are missing from the rotated journal; keep it for the
+                # next compaction rather than write a snapshot that loses them
+                return
+            with file_lock(self.snapshot_lock_path):
+                for dataset in DATASETS:
+                    _atomic_write(self.path(dataset), json.dumps(getattr(snapshot, dataset), indent=2))
+                _atomic_write(self.history_path, json.dumps(snapshot.balance_history.rows))
+                _atomic_write(self.snapshot_meta_path, json.dumps({"seq": seq}))
+
+                if os.path.exists(f"{self.journal_path}.old"):
+                    os.remove(f"{self.journal_path}.old")
+
+    def _rotate_journal(self):
+        old_path = f"{self.journal_path}.old"
+        if not os.path.exists(self.journal_path):
+            return
+        if os.path.exists(old_path):
+            # A previous compaction failed; keep its events until a snapshot succeeds
+            with open(self.journal_path, "rb") as src, open(old_path, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, old_path)
+
+
+class _CompactionBackend(JsonBackend):
+    """
+    Reads the last snapshot plus the rotated-out journal, for building the
+    next snapshot (the compacting process holds the compaction lock, so
+    neither changes meanwhile)
+    """
+
+    def load(self, store):
+        self._load_snapshot(store)
+
+
+def create_backend(name=None):
+    """Create the storage backend selected by SPL_STORAGE_BACKEND"""
+    name = name or STORAGE_BACKEND
+    if name == "json":
+        return JsonBackend()
+    if name == "sqlite":
+        from core.sqlite_storage import SqliteBackend
+        return SqliteBackend()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+class DataStore:
+    """
+    Process-wide in-memory repository for teams, matches and bets.
+
+    The data is loaded once from the storage backend and kept in memory
+    together with dict indexes, so lookups by match, team or (match, team)
+    don't need to rescan the lists. All mutations must happen while holding
+    ``lock``; they are written to the backend before being applied in memory.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_backend()
+        self.lock = threading.RLock()
+        self._compacting = False
+        self.load()
+
+    def load(self):
+        """(Re)load all data from the backend"""
+        with self.lock, span("store", "load"):
+            self.backend.load(self)
+
+    def refresh(self):
+        """Pick up changes other server processes made to the shared data"""
+        with self.lock:
+            self.backend.refresh(self)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the store lock and the backend's cross-process write lock
+
+        The store is caught up with other processes first, so checks made
+        inside the block still hold when the change is written: the balance
+        and duplicate bet checks of betting._prepare_bet, and the unsettled
+        match check of settlement.validate_result.
+        """
+        with self.lock, self.backend.write_lock(self):
+            yield
+
+    def reset(self, teams, matches, bets, history=()):
+        """Replace the in-memory data and rebuild the indexes"""
+        # Change tracking: a new epoch on every (re)load, then one generation
+        # counter per dataset plus an overall one, bumped on every mutation
+        self.epoch = uuid.uuid4().hex
+        self.generation = 0
+        self.generations = dict.fromkeys(DATASETS, 0)
+
+        self.teams = teams
+        self.matches = matches
+        self.bets = bets
+        self.teams_by_name = {t["team"]: t for t in self.teams}
+        self.leaderboard = Leaderboard(self.teams)
+        self.matches_by_id = {m["match_id"]: m for m in self.matches}
+        self.bets_by_key = {}
+        self.bets_by_team = {}
+        self.pending_by_match = {}
+        self.open_stakes = {}
+        for bet in self.bets:
+            self._index_bet(bet)
+
+        # Per-match standings; rebuilt from the bets if they don't cover every result
+        self.balance_history = BalanceHistory(history)
+        if any(m.get("winner") and m["match_id"] not in self.balance_history for m in self.matches):
+            self.balance_history = replay_history(self.teams, self.matches, self.bets, STARTING_BALANCE)
+
+        # Per-team bet history with running balances (imported here as it uses get_store)
+        from core.team_history import TeamHistory
+        self.team_history = TeamHistory(self)
+
+        # Bet fields as NumPy columns for verify_ledger (imported here for the same reason)
+        from core.ledger import LedgerColumns
+        self.ledger = LedgerColumns(self.bets)
+
+    def _index_bet(self, bet):
+        self.bets_by_key[(bet["match_id"], bet["team"])] = bet
+        self.bets_by_team.setdefault(bet["team"], []).append(bet)
+        if bet["status"] == "pending":
+            self.pending_by_match.setdefault(bet["match_id"], {})[bet["team"]] = bet
+            self.open_stakes[bet["team"]] = self.open_stakes.get(bet["team"], 0) + bet["amount"]
+
+    # Lookups
+
+    def get_team(self, team_name):
+        return self.teams_by_name.get(team_name)
+
+    def get_match(self, match_id):
+        return self.matches_by_id.get(match_id)
+
+    def get_bet(self, match_id, team_name):
+        return self.bets_by_key.get((match_id, team_name))
+
+    def get_team_bets(self, team_name):
+        return self.bets_by_team.get(team_name, [])
+
+    def get_pending_bets(self, match_id):
+        return list(self.pending_by_match.get(match_id, {}).values())
+
+    def version(self, dataset=None):
+        """Opaque version of a dataset (or of all data); changes whenever the data does"""
+        generation = self.generations[dataset] if dataset else self.generation
+        return [self.epoch, generation]
+
+    # Mutations (caller must hold self.lock)
+
+    def touch(self, *datasets):
+        """Record that the given datasets changed"""
+        self.generation += 1
+        for dataset in datasets:
+            self.generations[dataset] += 1
+
+    def add_bet(self, bet):
+        self.bets.append(bet)
+        self._index_bet(bet)
+
+    def mark_settled(self, bet):
+        """Drop a bet from the pending index once its status has been set"""
+        pending = self.pending_by_match.get(bet["match_id"])
+        if pending and pending.pop(bet["team"], None):
+            self.open_stakes[bet["team"]] -= bet["amount"]
+            if not pending:
+                del self.pending_by_match[bet["match_id"]]
+
+    def apply_bet(self, bet):
+        """Add a new bet and deduct its amount from the team's balance"""
+        team = self.get_team(bet["team"])
+        if team:
+            team["balance"] -= bet["amount"]
+            self.leaderboard.update(team["team"])
+        self.add_bet(bet)
+        self.team_history.add_bet(bet)
+        self.ledger.add(bet)
+        self.touch("teams", "bets")
+
+    def apply_settlement(self, match_id, winner, outcomes):
+        """
+        Record a match winner and the outcome of its bets.
+
+        Args:
+            match_id: The settled match
+            winner: The winning team
+            outcomes: List of {"team", "status", "winnings"} dicts, one per settled bet
+        """
+        match = self.get_match(match_id)
+        if match:
+            match["winner"] = winner
+        for outcome in outcomes:
+            bet = self.get_bet(match_id, outcome["team"])
+            if not bet:
+                continue
+            bet["status"] = outcome["status"]
+            bet["winnings"] = outcome["winnings"]
+            team = self.get_team(outcome["team"])
+            if team:
+                team["balance"] += outcome["winnings"]
+                self.leaderboard.update(team["team"])
+            self.mark_settled(bet)
+            self.team_history.settle(bet)
+            self.ledger.settle(bet)
+        if match:
+            self.balance_history.record(match_id, winner, self.settled_balances())
+        self.touch("matches", "bets", "teams")
+
+    def settled_balances(self):
+        """Team balances with stakes on unplayed matches counted back in"""
+        return {t["team"]: t["balance"] + self.open_stakes.get(t["team"], 0) for t in self.teams}
+
+    def apply_balances(self, balances):
+        """Overwrite team balances, e.g. with ones rebuilt from the ledger"""
+        for name, balance in balances.items():
+            team = self.get_team(name)
+            if team:
+                team["balance"] = balance
+                self.leaderboard.update(name)
+        self.touch("teams")
+
+    def commit_applied_bets(self, bets):
+        """
+        Persist bets that were already applied in memory (by the group-commit
+        writer) with a single backend write. On failure the in-memory state is
+        reloaded from the backend so it never runs ahead of what is on disk.
+        """
+        with self.transaction():
+            try:
+                self.backend.append_bets(bets)
+            except Exception:
+                self.load()
+                raise
+        self._maybe_compact()
+
+    def record_settlement(self, match_id, winner, outcomes):
+        """Persist a match settlement to the backend and apply it"""
+        self.record_settlements([(match_id, winner, outcomes)])
+
+    def record_settlements(self, settlements):
+        """
+        Persist several match settlements with a single backend write and apply them
+
+        Args:
+            settlements: List of (match_id, winner, outcomes) tuples
+        """
+        with self.transaction():
+            self.backend.append_settlements(settlements)
+            for match_id, winner, outcomes in settlements:
+                self.apply_settlement(match_id, winner, outcomes)
+            history = self.balance_history
+            self.backend.append_history([
+                history.rows[history.position_by_match[match_id]]
+                for match_id, _, _ in settlements if match_id in history
+            ])
+        self._maybe_compact()
+
+    def record_balances(self, balances):
+        """Persist corrected team balances ({team: balance}) to the backend and apply them"""
+        with self.transaction():
+            self.backend.set_balances(balances)
+            self.apply_balances(balances)
+        self._maybe_compact()
+
+    # Compaction
+
+    def _maybe_compact(self):
+        if self.backend.needs_compaction():
+            self.compact_async()
+
+    def compact_async(self):
+        """Start a background compaction unless one is already running"""
+        with self.lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, args=(True,), name="spl-compaction", daemon=True).start()
+
+    def compact(self, if_needed=False):
+        """Let the backend fold its write log into its snapshot"""
+        try:
+            self._compacting = True
+            with span("store", "compact"):
+                self.backend.compact(self, if_needed)
+        finally:
+            self._compacting = False
+
+    def files_data(self, *datasets):
+        """
+        Map of GitHub repository paths to a copy of their data, for the GitHub
+        sync helpers. Copies are taken under the lock so they can be serialized
+        after it is released.
+        """
+        with self.lock:
+            return {
+                f"data/{DATASETS[d]}": [dict(row) for row in getattr(self, d)]
+                for d in datasets or DATASETS
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide DataStore, loading it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DataStore()
+    # Cheap when nothing changed: a stat of the journal and snapshot files
+    _store.refresh()
+    return _store
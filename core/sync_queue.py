@@ -0,0 +1,241 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from core.storage import DATA_DIR, _atomic_write, _lock_file, _read_json, _unlock_file, get_store
+
+# Pending sync work, kept on disk so it survives a restart. Each server process
+# has its own file, locked (through "<file>.lock") for as long as it runs, so
+# processes sharing DATA_DIR don't overwrite each other's queue. A starting
+# worker takes over the files of processes that have exited.
+SYNC_QUEUE_FILE = os.path.join(DATA_DIR, f".sync_queue.{os.getpid()}.json")
+SYNC_QUEUE_PATTERN = os.path.join(DATA_DIR, ".sync_queue*.json")
+# Push to GitHub at most once every FLUSH_INTERVAL seconds...
+FLUSH_INTERVAL = float(os.environ.get("SPL_SYNC_INTERVAL", "10"))
+# ...unless this many changes are waiting
+FLUSH_MAX_CHANGES = int(os.environ.get("SPL_SYNC_MAX_CHANGES", "20"))
+# Seconds to wait before retrying a failed GitHub sync
+RETRY_DELAY = 30
+
+
+class SyncWorker:
+    """
+    Background daemon that pushes changed datasets to GitHub and refreshes the
+    Excel backup, so bets and results return as soon as the local commit is done.
+
+    Changes only mark datasets dirty. The daemon flushes at most once every
+    FLUSH_INTERVAL seconds, or sooner once FLUSH_MAX_CHANGES changes are
+    pending, so a burst of bets becomes a single commit. Since a flush always
+    pushes the latest in-memory data, nothing is lost by coalescing.
+    """
+
+    def __init__(self, store=None, path=SYNC_QUEUE_FILE, interval=FLUSH_INTERVAL, max_changes=FLUSH_MAX_CHANGES):
+        self.store = store or get_store()
+        self.path = path
+        self.interval = interval
+        self.max_changes = max_changes
+        self.cond = threading.Condition()
+
+        # Held until the process exits
+        self.owner_lock = _lock_file(f"{path}.lock")
+        state = _read_json(path, {})
+        self.github_pending = set(state.get("github", []))
+        self.excel_pending = state.get("excel", False)
+        self.saved_state = None
+        self._adopt_orphaned_queues()
+        self.changes = 0
+        self.force = False
+        self.next_flush_at = 0.0
+        self.flushes_started = 0
+        self.flushes_completed = 0
+        self.last_result = (True, "")
+        self.status = {"state": "idle", "last_sync": None, "last_error": None, "github_configured": None}
+
+        self.thread = threading.Thread(target=self._run, name="spl-sync-worker", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, datasets, excel=True):
+        """
+        Mark datasets dirty for the next GitHub sync (and optionally the Excel backup)
+
+        Args:
+            datasets: Dataset names that changed, e.g. ["bets", "teams"]
+            excel: Whether the Excel backup needs refreshing as well
+        """
+        with self.cond:
+            self.github_pending.update(datasets)
+            self.excel_pending = self.excel_pending or excel
+            self.changes += 1
+            self._save()
+            self.cond.notify_all()
+
+    def flush(self, datasets=(), force=False, timeout=120):
+        """
+        Sync now instead of waiting for the next scheduled flush
+
+        Args:
+            datasets: Extra datasets to push even if they are not dirty
+            force: Ignore the SHA cache so every file is compared with GitHub again
+            timeout: Seconds to wait for the flush to finish
+
+        Returns:
+            tuple: (success, message)
+        """
+        if force:
+            from core.github_storage import clear_sha_cache
+            clear_sha_cache()
+        with self.cond:
+            self.github_pending.update(datasets)
+            self.force = True
+            target = self.flushes_started + 1
+            self.cond.notify_all()
+            if not self.cond.wait_for(lambda: self.flushes_completed >= target, timeout):
+                return False, "Timed out waiting for the sync to finish"
+            return self.last_result
+
+    def get_status(self):
+        """Snapshot of the daemon state for display"""
+        with self.cond:
+            return {
+                **self.status,
+                "pending": sorted(self.github_pending),
+                "excel_pending": self.excel_pending,
+                "changes": self.changes,
+                "next_flush_in": max(self.next_flush_at - time.monotonic(), 0),
+            }
+
+    def _save(self):
+        # Only rewrite (and fsync) the file when the pending work changed
+        state = {"github": sorted(self.github_pending), "excel": self.excel_pending}
+        if state != self.saved_state:
+            _atomic_write(self.path, json.dumps(state))
+            self.saved_state = state
+
+    def _adopt_orphaned_queues(self):
+        """Merge in the queue files of processes that are no longer running"""
+        # Includes processes that exited before saving anything, leaving only a lock file
+        paths = set(glob.glob(SYNC_QUEUE_PATTERN))
+        paths.update(lock[:-len(".lock")] for lock in glob.glob(f"{SYNC_QUEUE_PATTERN}.lock"))
+        for path in sorted(paths):
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                continue
+            try:
+                lock = _lock_file(f"{path}.lock", blocking=False)
+            except BlockingIOError:
+                # Its process is still running
+                continue
+            try:
+                state = _read_json(path, {})
+                self.github_pending.update(state.get("github", []))
+                self.excel_pending = self.excel_pending or state.get("excel", False)
+                # Saved here before the orphaned file is removed
+                self._save()
+                for stale in (path, f"{path}.lock"):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+            finally:
+                _unlock_file(lock)
+
+    def _flush_due(self):
+        if self.force:
+            return True
+        if not self.github_pending and not self.excel_pending:
+            return False
+        return self.changes >= self.max_changes or time.monotonic() >= self.next_flush_at
+
+    def _run(self):
+        from core.excel_storage import backup_to_excel, init_excel_files
+
+        # Create any missing Excel backup files, once per process
+        try:
+            init_excel_files()
+        except Exception as e:
+            self.status.update(state="error", last_error=f"Excel initialization failed: {str(e)}")
+
+        while True:
+            with self.cond:
+                while not self._flush_due():
+                    pending = self.github_pending or self.excel_pending
+                    self.cond.wait(max(self.next_flush_at - time.monotonic(), 0.01) if pending else None)
+                datasets = sorted(self.github_pending)
+                excel = self.excel_pending
+                self.github_pending.clear()
+                self.excel_pending = False
+                self.changes = 0
+                self.force = False
+                self.flushes_started += 1
+                self.status["state"] = "syncing"
+
+            # Imported on the first flush, keeping requests off the page's import path
+            from core.github_storage import batch_update_github_files, is_github_configured
+
+            github_error = None
+            excel_error = None
+            message = "Nothing to sync"
+            configured = is_github_configured()
+            if datasets and configured:
+                try:
+                    success, message = batch_update_github_files(self.store.files_data(*datasets))
+                except Exception as e:
+                    success, message = False, str(e)
+                if not success:
+                    github_error = message
+            elif datasets:
+                message = "GitHub not configured"
+
+            if excel:
+                try:
+                    backup_to_excel()
+                except Exception as e:
+                    excel_error = f"Excel backup failed: {str(e)}"
+
+            error = github_error or excel_error
+            with self.cond:
+                # Keep failed work queued until it succeeds
+                if github_error:
+                    self.github_pending.update(datasets)
+                if excel_error:
+                    self.excel_pending = True
+                self.status["github_configured"] = configured
+                if error:
+                    self.status.update(state="error", last_error=error)
+                else:
+                    self.status.update(state="idle", last_sync=datetime.now().isoformat(), last_error=None)
+                self._save()
+
+                self.next_flush_at = time.monotonic() + (RETRY_DELAY if error else self.interval)
+                self.last_result = (error is None, error or message)
+                self.flushes_completed += 1
+                self.cond.notify_all()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_sync_worker():
+    """Return the process-wide sync daemon, starting it on first use"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = SyncWorker()
+    return _worker
+
+
+def enqueue_sync(datasets, excel=True):
+    """Mark changed datasets dirty for the background sync daemon"""
+    get_sync_worker().enqueue(datasets, excel)
+
+
+def flush_sync(datasets=(), force=False):
+    """Push pending (and the given) datasets right away and wait for the result"""
+    return get_sync_worker().flush(datasets, force)
+
+
+def get_sync_status():
+    return get_sync_worker().get_status()
@@ -1,66 +1,312 @@
+import argparse
+import csv
+import io
 import json
-from datetime import datetime
+import sys
+from core.storage import get_store
+
+
+class TeamHistory:
+    """
+    Per-team betting history, kept up to date by the data store.
+
+    Each team has its settled bets in the order they were settled, each with
+    the running total of its balance changes, plus its pending bets in the
+    order they were placed. Placing or settling a bet only touches that
+    team's entries, and the closing balance after each settled bet is
+    derived from the running total when the history is read:
+
+        closing = (current balance + open stakes) - total change + running total
+
+    which anchors the history on the current balance, so manual balance
+    corrections show up in the earliest rows rather than the latest.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.settled_by_team = {}
+        self.pending_by_team = {}
+        # Positions in settled_by_team of each team's won and lost bets
+        self.positions_by_status = {}
+
+        # Settled bets follow the order their matches were settled in, as far
+        # as the balance history knows it, then match date
+        order = store.balance_history.position_by_match
+        settled = [bet for bet in store.bets if bet["status"] != "pending"]
+        settled.sort(key=lambda bet: (order.get(bet["match_id"], len(order)),
+                                      (store.get_match(bet["match_id"]) or {}).get("date") or ""))
+        for bet in settled:
+            self.settle(bet)
+        pending = [bet for bet in store.bets if bet["status"] == "pending"]
+        pending.sort(key=lambda bet: bet.get("timestamp", ""))
+        for bet in pending:
+            self.add_bet(bet)
+
+    def _entry(self, bet):
+        match = self.store.get_match(bet["match_id"]) or {}
+        return {
+            "match_id": bet["match_id"],
+            "match": f"{match.get('team1')} vs {match.get('team2')}",
+            "date": match.get("date", ""),
+            "bet_amount": bet["amount"],
+            "prediction": bet["prediction"],
+            "is_home_team": bet.get("is_home_team", False),
+            "timestamp": bet.get("timestamp", ""),
+            "actual_winner": match.get("winner"),
+            "result": bet["status"],
+            "winnings": bet.get("winnings", 0),
+            # The stake left the balance when the bet was placed and the
+            # winnings (if any) came back when it was settled
+            "balance_change": bet.get("winnings", 0) - bet["amount"],
+        }
+
+    def add_bet(self, bet):
+        """Record a newly placed bet"""
+        self.pending_by_team.setdefault(bet["team"], {})[bet["match_id"]] = self._entry(bet)
+
+    def settle(self, bet):
+        """Move a bet from pending to settled once its status and winnings are set"""
+        self.pending_by_team.get(bet["team"], {}).pop(bet["match_id"], None)
+        entries = self.settled_by_team.setdefault(bet["team"], [])
+        entry = self._entry(bet)
+        entry["running_change"] = (entries[-1]["running_change"] if entries else 0) + entry["balance_change"]
+        positions = self.positions_by_status.setdefault(bet["team"], {})
+        positions.setdefault(entry["result"], []).append(len(entries))
+        entries.append(entry)
+
+    def get(self, team_name):
+        """
+        History of one team (caller must hold store.lock)
+
+        Returns:
+            tuple: (settled entries oldest first with "closing_balance",
+                    pending entries oldest first, total pending stake)
+        """
+        team = self.store.get_team(team_name)
+        settled = self.settled_by_team.get(team_name, [])
+        pending = list(self.pending_by_team.get(team_name, {}).values())
+        pending_amount = sum(entry["bet_amount"] for entry in pending)
+
+        total_change = settled[-1]["running_change"] if settled else 0
+        base = team["balance"] + pending_amount - total_change
+        history = [{**entry, "closing_balance": base + entry["running_change"]} for entry in settled]
+        # The stake of a pending bet is already off the balance
+        pending = [{**entry, "closing_balance": team["balance"]} for entry in pending]
+        return history, pending, pending_amount
+
+    def page(self, team_name, offset=0, limit=20, status=None):
+        """
+        One page of a team's history, newest first (caller must hold store.lock)
+
+        Pending bets come first, then settled bets from the most recently
+        settled. Only the entries on the page are copied and given a closing
+        balance.
+
+        Args:
+            team_name: The team
+            offset: Number of entries to skip
+            limit: Maximum number of entries to return
+            status: Only "pending", "won" or "lost" entries (all if None)
+
+        Returns:
+            tuple: (entries on the page, total number of matching entries, total pending stake)
+        """
+        team = self.store.get_team(team_name)
+        settled = self.settled_by_team.get(team_name, [])
+        pending = list(self.pending_by_team.get(team_name, {}).values())
+        pending_amount = sum(entry["bet_amount"] for entry in pending)
+        base = team["balance"] + pending_amount - (settled[-1]["running_change"] if settled else 0)
+
+        # Newest-first view as (pending entries, positions of settled entries)
+        if status is None:
+            newest_pending = pending[::-1]
+            positions = range(len(settled) - 1, -1, -1)
+        elif status == "pending":
+            newest_pending = pending[::-1]
+            positions = []
+        else:
+            newest_pending = []
+            positions = self.positions_by_status.get(team_name, {}).get(status, [])[::-1]
+
+        total = len(newest_pending) + len(positions)
+        entries = []
+        for i in range(offset, min(offset + limit, total)):
+            if i < len(newest_pending):
+                # The stake of a pending bet is already off the balance
+                entries.append({**newest_pending[i], "closing_balance": team["balance"]})
+            else:
+                entry = settled[positions[i - len(newest_pending)]]
+                entries.append({**entry, "closing_balance": base + entry["running_change"]})
+        return entries, total, pending_amount
+
 
 def get_team_history(team_name):
     """
     Get the betting history and balance changes for a specific team.
-    Returns a list of bets and their outcomes, along with balance changes.
+    Returns the settled bets (oldest first) with the closing balance after
+    each one, and the pending bets with the stake they tie up.
     """
     try:
-        # Load data from JSON
-        with open("data/teams.json") as f:
-            teams = json.load(f)
-        with open("data/matches.json") as f:
-            matches = json.load(f)
-        with open("data/bets.json") as f:
-            bets = json.load(f)
-            
-        # Get team info
-        team_info = next((t for t in teams if t["team"] == team_name), None)
-        if not team_info:
-            return {"error": f"Team {team_name} not found."}
-            
-        # Get all bets for this team
-        team_bets = [b for b in bets if b["team"] == team_name]
-        
-        # Sort bets by timestamp
-        team_bets.sort(key=lambda x: x.get("timestamp", ""))
-        
-        # Create history entries
-        history = []
-        
-        for bet in team_bets:
-            match_id = bet["match_id"]
-            match = next((m for m in matches if m["match_id"] == match_id), None)
-            
-            if not match:
-                continue
-                
-            # Only include completed matches
-            if not match.get("winner"):
-                continue
-                
-            # Create history entry
-            entry = {
-                "match_id": match_id,
-                "match": f"{match['team1']} vs {match['team2']}",
-                "date": match.get("date", ""),
-                "bet_amount": bet["amount"],
-                "prediction": bet["prediction"],
-                "actual_winner": match["winner"],
-                "result": bet["status"],
-                "winnings": bet.get("winnings", 0),
-                "balance_change": bet.get("winnings", 0) - bet["amount"] if bet["status"] == "won" else -bet["amount"]
+        store = get_store()
+
+        with store.lock:
+            # Get team info
+            team_info = store.get_team(team_name)
+            if not team_info:
+                return {"error": f"Team {team_name} not found."}
+
+            history, pending, pending_amount = store.team_history.get(team_name)
+
+            return {
+                "team": team_name,
+                "current_balance": team_info["balance"],
+                "home_team": team_info.get("home_team", ""),
+                "history": history,
+                "pending": pending,
+                "pending_amount": pending_amount,
             }
-            
-            history.append(entry)
-            
-        return {
+
+    except Exception as e:
+        return {"error": f"Error retrieving team history: {str(e)}"}
+
+
+def get_team_history_page(team_name, offset=0, limit=20, status=None):
+    """
+    Get one page of a team's betting history, newest first.
+
+    Args:
+        team_name: The team
+        offset: Number of entries to skip (negative counts as 0)
+        limit: Page size (negative counts as 0)
+        status: "pending", "won" or "lost" to filter the entries (all if None)
+
+    Returns:
+        dict: Team details plus "entries" on the page and "total" matching entries
+    """
+    # Negative values would index the history from the end
+    offset = max(offset, 0)
+    limit = max(limit, 0)
+    try:
+        store = get_store()
+
+        with store.lock:
+            team_info = store.get_team(team_name)
+            if not team_info:
+                return {"error": f"Team {team_name} not found."}
+
+            entries, total, pending_amount = store.team_history.page(team_name, offset, limit, status)
+
+            return {
+                "team": team_name,
+                "current_balance": team_info["balance"],
+                "home_team": team_info.get("home_team", ""),
+                "entries": entries,
+                "total": total,
+                "offset": offset,
+                "limit": limit,
+                "pending_amount": pending_amount,
+            }
+
+    except Exception as e:
+        return {"error": f"Error retrieving team history: {str(e)}"}
+
+
+# Columns of the per-bet CSV statement
+STATEMENT_COLUMNS = [
+    "team", "home_team", "match_id", "match", "date", "prediction", "is_home_team",
+    "bet_amount", "result", "winnings", "balance_change", "closing_balance",
+]
+
+
+def _summary(team, rank, history, pending, pending_amount):
+    return {
+        "rank": rank,
+        "current_balance": team["balance"],
+        "bets": len(history) + len(pending),
+        "won": sum(1 for entry in history if entry["result"] == "won"),
+        "lost": sum(1 for entry in history if entry["result"] == "lost"),
+        "pending": len(pending),
+        "staked": sum(entry["bet_amount"] for entry in history),
+        "winnings": sum(entry["winnings"] for entry in history),
+        "net": history[-1]["running_change"] if history else 0,
+        "pending_amount": pending_amount,
+    }
+
+
+def iter_team_histories():
+    """
+    Yield the history and summary of every team, one team at a time
+
+    Bets are already grouped by team in the store's history index, so this
+    is one pass over the teams. The store lock is only held while a team is
+    copied, and nothing is accumulated across teams, so memory stays flat
+    however many teams there are.
+
+    Yields:
+        dict: {"team", "home_team", "summary", "history", "pending"}
+    """
+    store = get_store()
+    with store.lock:
+        team_names = [team["team"] for team in store.teams]
+
+    for team_name in team_names:
+        with store.lock:
+            team = store.get_team(team_name)
+            if not team:
+                continue
+            history, pending, pending_amount = store.team_history.get(team_name)
+            summary = _summary(team, store.leaderboard.rank_of(team_name), history, pending, pending_amount)
+        yield {
             "team": team_name,
-            "current_balance": team_info["balance"],
-            "home_team": team_info.get("home_team", ""),
-            "history": history
+            "home_team": team.get("home_team", ""),
+            "summary": summary,
+            "history": history,
+            "pending": pending,
         }
-        
-    except Exception as e:
-        return {"error": f"Error retrieving team history: {str(e)}"}
\ No newline at end of file
+
+
+def export_team_histories(fmt="jsonl"):
+    """
+    Stream every team's statement as text
+
+    Args:
+        fmt: "jsonl" for one JSON object per team (summary and bets), or
+             "csv" for one row per bet, pending bets last for each team
+
+    Yields:
+        str: The output for one team at a time (the CSV header comes with the first)
+    """
+    if fmt == "jsonl":
+        for statement in iter_team_histories():
+            yield json.dumps(statement) + "\n"
+    elif fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=STATEMENT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for statement in iter_team_histories():
+            for entry in statement["history"] + statement["pending"]:
+                writer.writerow({**entry, "team": statement["team"], "home_team": statement["home_team"]})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every team's betting history")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        for chunk in export_team_histories(args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
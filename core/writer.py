@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+from core.metrics import span
+from core.storage import get_store
+
+# How long the writer waits for more bets to join a batch, in seconds
+BATCH_WINDOW = float(os.environ.get("SPL_GROUP_COMMIT_WINDOW", "0.005"))
+# Upper bound on the number of bets committed together
+MAX_BATCH = 256
+# How long place_bet waits for its bet to be committed, in seconds
+SUBMIT_TIMEOUT = float(os.environ.get("SPL_GROUP_COMMIT_TIMEOUT", "30"))
+
+
+class _Request:
+    __slots__ = ("prepare", "result", "done", "cancelled")
+
+    def __init__(self, prepare):
+        self.prepare = prepare
+        self.result = None
+        self.done = threading.Event()
+        self.cancelled = False
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread for new bets.
+
+    Concurrent place_bet calls are queued; the writer takes every request that
+    arrives within BATCH_WINDOW of the first one, validates them in order
+    against the in-memory state (so two bets from the same team can't both
+    pass the balance or duplicate checks) and persists the valid ones with a
+    single backend write.
+    """
+
+    def __init__(self, store=None, window=BATCH_WINDOW, max_batch=MAX_BATCH, timeout=SUBMIT_TIMEOUT):
+        self.store = store or get_store()
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="spl-group-commit", daemon=True)
+        self.thread.start()
+
+    def submit(self, prepare):
+        """
+        Queue a bet for the next group commit and wait until it is committed
+
+        Args:
+            prepare: Callable taking the store and returning the new bet dict,
+                     or an error message string if the bet is invalid
+
+        Returns:
+            The committed bet dict, or an error message string
+        """
+        request = _Request(prepare)
+        self.queue.put(request)
+        if not request.done.wait(self.timeout):
+            # Skipped if the writer hasn't reached it yet; if it is being
+            # committed right now the outcome is unknown
+            request.cancelled = True
+            return "Timed out saving the bet. Check your bets before placing it again."
+        return request.result
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self.queue.get(timeout=self.window))
+            except queue.Empty:
+                pass
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # Keep the writer alive for the bets queued behind this batch
+                for request in batch:
+                    if not request.done.is_set():
+                        request.result = f"Error saving bet: {str(e)}"
+                        request.done.set()
+
+    def _commit(self, batch):
+        store = self.store
+        staged = []
+        writing = written = False
+        try:
+            # Validate and write under the cross-process write lock, caught up
+            # with whatever other server processes committed
+            with store.transaction():
+                for request in batch:
+                    if request.cancelled:
+                        continue
+                    try:
+                        request.result = request.prepare(store)
+                    except Exception as e:
+                        request.result = f"Error placing bet: {str(e)}"
+                        continue
+                    if isinstance(request.result, dict):
+                        # Apply immediately so later requests in the batch see it
+                        staged.append(request)
+                        store.apply_bet(request.result)
+
+                if staged:
+                    writing = True
+                    with span("place_bet", "write"):
+                        store.commit_applied_bets([r.result for r in staged])
+                    written = True
+        except Exception as e:
+            # Nothing in the batch was stored (or, if only releasing the lock
+            # failed, everything was). commit_applied_bets reloads the store
+            # itself when the write fails; otherwise drop the bets applied in
+            # memory here.
+            if staged and not writing:
+                try:
+                    store.load()
+                except Exception:
+                    pass
+            for request in batch:
+                if not isinstance(request.result, str) and not written:
+                    request.result = f"Error saving bet: {str(e)}"
+        finally:
+            for request in batch:
+                request.done.set()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide group-commit writer, starting it on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+    return _writer
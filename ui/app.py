@@ -3,20 +3,32 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
-from core.leaderboard import get_leaderboard
-from core.excel_storage import init_excel_files
-from core.team_history import get_team_history
+from core.leaderboard import get_leaderboard, get_rank_history, get_teams_around
+from core.team_history import get_team_history_page
+from core.sync_queue import get_sync_worker
+from ui.data_cache import load_data
+from ui.profiling import profile_page
 import json
 from datetime import datetime, timedelta
 import pandas as pd
+import altair as alt
 import hashlib
 
+# Profile this run instead when SPL_PROFILE is set (see ui/profiling.py)
+profile_page(__file__)
+
 # Replace the plain text password with the hash
 PASSWORD_HASH = "f1697db23226e6cc2483c266370b5cd0e8a89f700515f6bc98d2b4a9ff17dc93"
 
 # Create a cookie file path
 COOKIE_FILE = "data/.auth_cookie"
 
+# Number of teams shown on the public leaderboard
+LEADERBOARD_SIZE = 20
+
+# Bets per page in the team betting history
+HISTORY_PAGE_SIZE = 10
+
 # Ensure data directory exists
 os.makedirs("data", exist_ok=True)
 
@@ -517,8 +529,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize Excel files
-init_excel_files()
+# Start the background sync daemon, which creates any missing Excel files once per process
+get_sync_worker()
 
 # Helper function to format currency
 def format_currency(amount):
@@ -538,25 +550,11 @@ def format_date(date_str):
     except:
         return date_str
 
-# Cache data loading to improve performance
-@st.cache_data(ttl=60)  # Cache for 60 seconds
-def load_data():
-    with open("data/teams.json") as f:
-        teams = json.load(f)
-    with open("data/matches.json") as f:
-        matches = json.load(f)
-    try:
-        with open("data/bets.json") as f:
-            bets = json.load(f)
-    except:
-        bets = []
-    return teams, matches, bets
-
 # Main header
 st.markdown("<h1 class='main-header'>🏏 SPL Betting Platform</h1>", unsafe_allow_html=True)
 
 # Load data
-teams, matches, bets = load_data()
+teams, matches = load_data()
 
 # Create team options for dropdowns
 team_options = [team["team"] for team in teams]
@@ -574,8 +572,8 @@ with st.container():
         <h2 class='section-header'>🏆 Leaderboard</h2>
         """, unsafe_allow_html=True)
         
-        # Get leaderboard data
-        leaderboard = get_leaderboard()
+        # Get leaderboard data (only the top of it in a large league)
+        leaderboard = get_leaderboard(LEADERBOARD_SIZE)
         
         # Create a DataFrame for the leaderboard
         leaderboard_data = []
@@ -589,6 +587,61 @@ with st.container():
         
         leaderboard_df = pd.DataFrame(leaderboard_data)
         st.table(leaderboard_df)
+        
+        # Let teams outside the top find their own position
+        if len(team_options) > LEADERBOARD_SIZE:
+            rank_team = st.selectbox("Find your team", team_options, key="rank_team")
+            around_data = [{
+                "Rank": rank,
+                "Team": team["team"],
+                "Home Team": team.get("home_team", "N/A"),
+                "Balance": format_currency(team["balance"])
+            } for rank, team in get_teams_around(rank_team)]
+            st.table(pd.DataFrame(around_data))
+        st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Create a centered container for the rank history chart
+    col1, col2, col3 = st.columns([1, 4, 1])
+    
+    with col2:
+        st.markdown("""
+        <div style="background-color: #313244; border-radius: 8px; padding: .5rem; margin-top: 3rem; margin-bottom: 1rem; border: 2px solid #45475a;">
+        <h2 class='section-header'>📈 Season So Far</h2>
+        """, unsafe_allow_html=True)
+        
+        chart_teams = st.multiselect("Teams", team_options,
+                                     default=[team["team"] for team in leaderboard[:3]],
+                                     key="chart_teams")
+        chart_rows = []
+        for team_name in chart_teams:
+            for point in get_rank_history(team_name):
+                chart_rows.append({
+                    "Match": point["match_id"],
+                    "Team": team_name,
+                    "Rank": point["rank"],
+                    "Balance (Cr)": point["balance"] / 10000000,
+                })
+        
+        if chart_rows:
+            chart_df = pd.DataFrame(chart_rows)
+            rank_tab, balance_tab = st.tabs(["Rank", "Balance"])
+            with rank_tab:
+                # Rank 1 at the top
+                st.altair_chart(alt.Chart(chart_df).mark_line(point=True).encode(
+                    x=alt.X("Match:O", sort=None),
+                    y=alt.Y("Rank:Q", scale=alt.Scale(reverse=True, domainMin=1), axis=alt.Axis(tickMinStep=1)),
+                    color="Team:N",
+                    tooltip=["Team", "Match", "Rank", "Balance (Cr)"],
+                ), use_container_width=True)
+            with balance_tab:
+                st.altair_chart(alt.Chart(chart_df).mark_line(point=True).encode(
+                    x=alt.X("Match:O", sort=None),
+                    y="Balance (Cr):Q",
+                    color="Team:N",
+                    tooltip=["Team", "Match", "Rank", "Balance (Cr)"],
+                ), use_container_width=True)
+        else:
+            st.info("No results yet.")
         st.markdown("</div>", unsafe_allow_html=True)
     
     # Create a centered container for the history form
@@ -609,105 +662,62 @@ with st.container():
             # Submit button with matching green color
             submit_button = st.form_submit_button(label="View History")
     
-    # Only process history when the form is submitted
+    # Remember the submitted team so paging reruns keep showing its history
     if submit_button:
-        # Get team history
-        history_data = get_team_history(history_team)
-        
-        # Get pending bets
-        try:
-            with open("data/bets.json") as f:
-                all_bets = json.load(f)
-            
-            pending_bets = [bet for bet in all_bets 
-                            if bet["team"] == history_team and bet["status"] == "pending"]
-            pending_bets_amount = sum(bet["amount"] for bet in pending_bets)
-        except Exception as e:
-            pending_bets = []
-            pending_bets_amount = 0
-            st.error(f"Error calculating pending bets: {str(e)}")
+        st.session_state.history_view = history_team
+        st.session_state.history_page = 0
+    
+    if st.session_state.get("history_view"):
+        history_view = st.session_state.history_view
         
         col1, col2, col3 = st.columns([1, 4, 1])
         
         with col2:
-            if isinstance(history_data, dict) and "error" in history_data:
+            # Filter by result; changing it starts again from the first page
+            status_filter = st.radio("Show", ["All", "Pending", "Won", "Lost"], horizontal=True,
+                                     key="history_status", on_change=lambda: st.session_state.update(history_page=0))
+            status = None if status_filter == "All" else status_filter.lower()
+            page = st.session_state.get("history_page", 0)
+            
+            # Only the visible page is fetched from the history index
+            history_data = get_team_history_page(history_view, offset=page * HISTORY_PAGE_SIZE,
+                                                 limit=HISTORY_PAGE_SIZE, status=status)
+            
+            if "error" in history_data:
                 st.error(history_data["error"])
-            elif isinstance(history_data, list) or (isinstance(history_data, dict) and "history" in history_data):
-                # Get current team balance and home team
-                current_team = next((t for t in teams if t["team"] == history_team), None)
-                current_balance = current_team["balance"] if current_team else 0
-                home_team = current_team.get("home_team", "") if current_team else ""
-                
-                # Starting balance for history calculation (current balance)
-                starting_balance = current_balance
+            else:
+                home_team = history_data.get("home_team", "")
+                pending_bets_amount = history_data.get("pending_amount", 0)
+                total = history_data["total"]
                 
-                # Create a DataFrame for the history
+                # Create a DataFrame for the page, newest first
                 history_entries = []
-                running_balance = starting_balance
-                
-                # Add pending bets to history entries
-                for bet in pending_bets:
-                    try:
-                        # Get match details
-                        with open("data/matches.json") as f:
-                            matches = json.load(f)
-                        match = next((m for m in matches if m["match_id"] == bet["match_id"]), None)
-                        
-                        if match:
-                            # Determine if this was a home team bet
-                            is_home_team_bet = bet.get("prediction", "") == home_team
-                            home_team_display = home_team if is_home_team_bet else ""
-                            
-                            # For pending bets, the closing balance is the current balance
-                            # The bet amount has already been deducted when the bet was placed
-                            history_entries.append({
-                                "Match": f"{match['team1']} vs {match['team2']}",
-                                "Date": format_date(match.get("date", "")) or "N/A",
-                                "Bet On": bet.get("prediction", "N/A"),
-                                "Home Team": home_team_display,
-                                "Amount": format_currency(bet["amount"]),
-                                "Result": "PENDING",
-                                "Winnings": "N/A",
-                                "Closing Balance": format_currency(running_balance)
-                            })
-                    except Exception as e:
-                        st.error(f"Error processing pending bet: {str(e)}")
-                
-                # Process completed bets in reverse order to calculate running balance
-                history_list = history_data if isinstance(history_data, list) else history_data.get("history", [])
-                sorted_history = sorted(history_list, 
-                                       key=lambda x: x.get("date", ""), 
-                                       reverse=True)
-                
-                # Add back pending bets amount to get the balance before pending bets
-                running_balance_for_history = running_balance + pending_bets_amount
-                
-                for entry in sorted_history:
-                    # Calculate balance change
-                    balance_change = entry.get("balance_change", 0)
-                    
-                    # For display, we're going backwards in time
-                    closing_balance = running_balance_for_history
-                    running_balance_for_history -= balance_change
-                    
-                    # Format the result with color
-                    result_status = "won" if entry.get("result") == "won" else "lost"
-                    
+                for entry in history_data["entries"]:
                     # Determine if this was a home team bet
                     is_home_team_bet = entry.get("prediction", "") == home_team
                     home_team_display = home_team if is_home_team_bet else ""
                     
+                    # For pending bets, the closing balance is the current balance
+                    # The bet amount has already been deducted when the bet was placed
                     history_entries.append({
                         "Match": entry.get("match", "N/A"),
                         "Date": format_date(entry.get("date", "")) or "N/A",
                         "Bet On": entry.get("prediction", "N/A"),
                         "Home Team": home_team_display,
                         "Amount": format_currency(entry.get("bet_amount", 0)),
-                        "Result": result_status.upper(),
+                        "Result": entry.get("result", "").upper(),
                         "Winnings": format_currency(entry.get("winnings", 0)) if entry.get("result") == "won" else "N/A",
-                        "Closing Balance": format_currency(closing_balance)
+                        "Closing Balance": format_currency(entry["closing_balance"])
                     })
                 
+                # Display pending bets information
+                if pending_bets_amount > 0:
+                    st.markdown(f"""
+                    <div class='info-box'>
+                        <p>Note: <strong>{format_currency(pending_bets_amount)}</strong> is currently tied up in pending bets</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                
                 # Display as a styled table if we have data
                 if history_entries:
                     history_df = pd.DataFrame(history_entries)
@@ -728,21 +738,27 @@ with st.container():
                             return 'color: #a6e3a1; font-weight: bold'
                         return ''
                     
-                    # Apply the styling
-                    styled_history = history_df.style.applymap(highlight_result, subset=['Result'])
-                    styled_history = styled_history.applymap(highlight_home_team, subset=['Home Team'])
-                    
-                    # Display pending bets information
-                    if pending_bets_amount > 0:
-                        st.markdown(f"""
-                        <div class='info-box'>
-                            <p>Note: <strong>{format_currency(pending_bets_amount)}</strong> is currently tied up in pending bets</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    # Apply the styling (to this page only)
+                    styled_history = history_df.style.map(highlight_result, subset=['Result'])
+                    styled_history = styled_history.map(highlight_home_team, subset=['Home Team'])
                     
                     st.table(styled_history)
+                    
+                    # Page navigation
+                    page_count = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+                    if page_count > 1:
+                        prev_col, info_col, next_col = st.columns([1, 2, 1])
+                        with prev_col:
+                            if st.button("← Newer", disabled=page == 0, key="history_prev"):
+                                st.session_state.history_page = page - 1
+                                st.rerun()
+                        with info_col:
+                            st.markdown(f"<p style='text-align: center;'>Page {page + 1} of {page_count} ({total} bets)</p>",
+                                        unsafe_allow_html=True)
+                        with next_col:
+                            if st.button("Older →", disabled=page >= page_count - 1, key="history_next"):
+                                st.session_state.history_page = page + 1
+                                st.rerun()
                 else:
                     st.markdown("<div class='warning-box'>No betting history available for this team.</div>", unsafe_allow_html=True)
-            else:
-                st.markdown("<div class='warning-box'>No betting history available for this team.</div>", unsafe_allow_html=True)
             st.markdown("</div>", unsafe_allow_html=True)
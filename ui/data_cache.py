@@ -0,0 +1,28 @@
+import streamlit as st
+from core.storage import get_store
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_version(dataset, epoch, generation):
+    # One copy of a dataset per store version, shared by every session. The
+    # version only changes when a write touches that dataset, so e.g. a new
+    # bet re-copies teams (balances) but not matches.
+    store = get_store()
+    with store.lock:
+        return [dict(row) for row in getattr(store, dataset)]
+
+
+def _load(dataset):
+    epoch, generation = get_store().version(dataset)
+    return _load_version(dataset, epoch, generation)
+
+
+def load_data():
+    """
+    Teams and matches as of the latest committed change
+
+    Bets aren't included: the pages read them through the store's indexed
+    queries, and copying every bet on each new bet would stall writers.
+    The returned lists are shared between sessions and must not be modified.
+    """
+    return _load("teams"), _load("matches")
@@ -4,15 +4,17 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')
 
 import streamlit as st
 from core.betting import place_bet
-from core.results import update_result
-from core.excel_storage import init_excel_files
-import json
+from core.results import update_results
+from core.settlement import SettlementError, settle_match
+from ui.data_cache import load_data
+from ui.profiling import get_profiles, profile_page
 from datetime import datetime
 import pandas as pd
-from core.github_storage import test_github_connection
-from core.github_storage import update_json_file
-import time
-from core.github_storage import batch_update_github_files
+from core.metrics import get_metrics, reset_metrics
+from core.sync_queue import flush_sync, get_sync_status, get_sync_worker
+
+# Profile this run instead when SPL_PROFILE is set (see ui/profiling.py)
+profile_page(__file__)
 
 # Initialize session state for confirmation dialog
 if 'confirm_update' not in st.session_state:
@@ -21,6 +23,10 @@ if 'confirm_match_id' not in st.session_state:
     st.session_state.confirm_match_id = None
 if 'confirm_winner' not in st.session_state:
     st.session_state.confirm_winner = None
+if 'last_settlement' not in st.session_state:
+    st.session_state.last_settlement = None
+if 'bulk_result' not in st.session_state:
+    st.session_state.bulk_result = None
 
 # Set page configuration
 st.set_page_config(
@@ -378,8 +384,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize Excel files
-init_excel_files()
+# Start the background sync daemon, which creates any missing Excel files once per process
+get_sync_worker()
 
 # Main header
 st.markdown("<h1 class='main-header'>🏏 SPL Betting Platform - Admin Panel</h1>", unsafe_allow_html=True)
@@ -402,22 +408,8 @@ def format_date(date_str):
     except:
         return date_str
 
-# Cache data loading to improve performance
-@st.cache_data(ttl=60)  # Cache for 60 seconds
-def load_data():
-    with open("data/teams.json") as f:
-        teams = json.load(f)
-    with open("data/matches.json") as f:
-        matches = json.load(f)
-    try:
-        with open("data/bets.json") as f:
-            bets = json.load(f)
-    except:
-        bets = []
-    return teams, matches, bets
-
 # Load data
-teams, matches, bets = load_data()
+teams, matches = load_data()
 
 # Create team options for dropdowns
 team_options = [team["team"] for team in teams]
@@ -533,8 +525,6 @@ with st.container():
                 result = place_bet(team, match_id, prediction, amount)
                 if "successfully" in result:
                     st.success(result)
-                    # Clear cache to force data reload
-                    load_data.clear()
                     st.rerun()  # Refresh the page to show updated balance
                 else:
                     st.error(result)
@@ -566,18 +556,37 @@ with st.container():
             
             with col2_confirm:
                 if st.button("Yes, Update Result"):
-                    result = update_result(st.session_state.confirm_match_id, st.session_state.confirm_winner)
-                    if "updated" in result:
-                        st.success(result)
-                        # Clear cache to force data reload
-                        load_data.clear()
+                    try:
+                        report = settle_match(st.session_state.confirm_match_id, st.session_state.confirm_winner)
+                    except SettlementError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Error updating result: {str(e)}")
+                    else:
+                        # Keep the report so it can be shown after the rerun
+                        st.session_state.last_settlement = report
                         # Reset confirmation dialog state
                         st.session_state.confirm_update = False
                         st.session_state.confirm_match_id = None
                         st.session_state.confirm_winner = None
                         st.rerun()  # Refresh the page to show updated balances
-                    else:
-                        st.error(result)
+
+        # Report of the most recently settled match
+        report = st.session_state.last_settlement
+        if report:
+            st.success(f"Match {report['match_id']} result updated. Winner: {report['winner']}")
+            if report["bets"]:
+                df_report = pd.DataFrame(report["bets"])[["team", "prediction", "amount", "status", "winnings", "net", "balance_after"]]
+                for col in ["amount", "winnings", "net", "balance_after"]:
+                    df_report[col] = df_report[col].apply(format_currency)
+                df_report.columns = ["Team", "Prediction", "Bet", "Status", "Credited", "Net", "New Balance"]
+                st.dataframe(df_report, hide_index=True, use_container_width=True)
+                st.caption(f"Staked: {format_currency(report['total_staked'])} | Paid out: {format_currency(report['total_paid'])}")
+            else:
+                st.caption("No pending bets on this match.")
+            if st.button("Dismiss", key="dismiss_settlement"):
+                st.session_state.last_settlement = None
+                st.rerun()
         
         # The regular Update Match Result section
         st.markdown("""
@@ -637,32 +646,86 @@ with st.container():
                 st.session_state.confirm_winner = winner_team
                 st.rerun()
         
-        st.markdown("</div>", unsafe_allow_html=True) 
+        # Several results at once (double-headers, catching up after an outage)
+        if st.session_state.bulk_result:
+            st.success(st.session_state.bulk_result)
+            st.session_state.bulk_result = None
+        if len(pending_matches) > 1:
+            with st.expander("Bulk Update Results"):
+                with st.form("bulk_results_form"):
+                    bulk_winners = {}
+                    for m in pending_matches:
+                        bulk_winners[m["match_id"]] = st.selectbox(
+                            f"Match {m['match_id']}: {m['team1']} vs {m['team2']} ({format_date(m['date'])})",
+                            ["Not played yet", m["team1"], m["team2"]],
+                            key=f"bulk_winner_{m['match_id']}")
+                    confirm_bulk = st.checkbox("I confirm these results are final. This action cannot be undone.")
+                    submit_bulk = st.form_submit_button("Update Selected Results")
+
+                if submit_bulk:
+                    bulk_results = [(match_id, winner) for match_id, winner in bulk_winners.items()
+                                    if winner != "Not played yet"]
+                    if not bulk_results:
+                        st.warning("Select the winner of at least one match.")
+                    elif not confirm_bulk:
+                        st.warning("Please confirm the results before updating.")
+                    else:
+                        result = update_results(bulk_results)
+                        if result.startswith("Results updated"):
+                            st.session_state.bulk_result = result
+                            st.rerun()
+                        else:
+                            st.error(result)
+
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # Performance Section
+    col1, col2, col3 = st.columns([1, 4, 1])
+
+    with col2:
+        with st.expander("⏱️ Performance"):
+            # Latency of each stage of the hot paths since the server started
+            metrics = get_metrics()
+            if metrics:
+                df_metrics = pd.DataFrame(metrics)
+                for col in ["p50", "p95", "p99", "max"]:
+                    df_metrics[col] = df_metrics[col] * 1000
+                df_metrics = df_metrics[["operation", "stage", "count", "p50", "p95", "p99", "max", "total"]]
+                df_metrics.columns = ["Operation", "Stage", "Calls", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)", "Total (s)"]
+                st.dataframe(df_metrics.round(2), hide_index=True, use_container_width=True)
+                st.caption("Percentiles are bucketed to within about 10%. \"total\" is the whole operation.")
+            else:
+                st.caption("No timings recorded yet.")
+            if st.button("Reset Timings", key="reset_metrics"):
+                reset_metrics()
+                st.rerun()
+
+        with st.expander("🔬 Slowest Reruns"):
+            # Page runs profiled with SPL_PROFILE=1 (see ui/profiling.py)
+            profiles = get_profiles()
+            if profiles:
+                df_profiles = pd.DataFrame(profiles)[["page", "started", "seconds", "outcome", "stats_file"]]
+                df_profiles["seconds"] = df_profiles["seconds"].round(3)
+                df_profiles.columns = ["Page", "Started", "Seconds", "Outcome", "Stats File"]
+                st.dataframe(df_profiles, hide_index=True, use_container_width=True)
+
+                profile_options = [f"{p['page']} at {p['started']} ({p['seconds']:.3f}s)" for p in profiles]
+                selected_profile = st.selectbox("Top functions of", range(len(profiles)),
+                                                format_func=lambda i: profile_options[i], key="profile_select")
+                df_top = pd.DataFrame(profiles[selected_profile]["top"])
+                if not df_top.empty:
+                    df_top = df_top[["function", "calls", "own_seconds", "cumulative_seconds"]].round(4)
+                    df_top.columns = ["Function", "Calls", "Own (s)", "Cumulative (s)"]
+                    st.dataframe(df_top, hide_index=True, use_container_width=True)
+            else:
+                st.caption("No profiled runs. Start the app with SPL_PROFILE=1 to profile every page run.")
 
 def sync_data_to_github():
-    """Force sync all data files to GitHub using batch update"""
+    """Force sync all data files to GitHub through the sync daemon"""
     
     try:
-        # Load data files
-        with open("data/teams.json") as f:
-            teams = json.load(f)
-        with open("data/matches.json") as f:
-            matches = json.load(f)
-        try:
-            with open("data/bets.json") as f:
-                bets = json.load(f)
-        except:
-            bets = []
-            
-        # Create file-data map for batch update
-        files_data = {
-            "data/teams.json": teams,
-            "data/matches.json": matches,
-            "data/bets.json": bets
-        }
-        
-        # Perform batch update
-        success, message = batch_update_github_files(files_data)
+        # Flush pending changes now, pushing every dataset and bypassing the SHA cache
+        success, message = flush_sync(["teams", "matches", "bets"], force=True)
         
         if success:
             return True, "All data successfully synced to GitHub"
@@ -681,6 +744,8 @@ with st.sidebar:
     # Test connection button
     if st.button("Test GitHub Connection", key="github-sync-btn", use_container_width=True):
         with st.spinner("Testing GitHub connection..."):
+            # Imported on demand so requests isn't loaded on every page start
+            from core.github_storage import test_github_connection
             success, message = test_github_connection()
             if success:
                 st.success(message)
@@ -690,6 +755,7 @@ with st.sidebar:
     # Force sync button
     if st.button("Force Sync to GitHub", key="github-sync-btn1", use_container_width=True):
         with st.spinner("Syncing data to GitHub..."):
+            from core.github_storage import test_github_connection
             success, message = test_github_connection()
             if not success:
                 st.error(f"Could not connect to GitHub: {message}")
@@ -698,4 +764,19 @@ with st.sidebar:
                 if success:
                     st.success(message)
                 else:
-                    st.error(message)
\ No newline at end of file
+                    st.error(message)
+    
+    # Background sync status (bets and results return before GitHub/Excel are updated)
+    sync_status = get_sync_status()
+    pending = sync_status["pending"] + (["excel"] if sync_status["excel_pending"] else [])
+    if sync_status["state"] == "error":
+        st.error(f"Background sync failed, will retry: {sync_status['last_error']}")
+    elif sync_status["state"] == "syncing":
+        st.info("Sync in progress")
+    elif pending:
+        st.info(f"{sync_status['changes']} change(s) waiting to sync ({', '.join(pending)}), "
+                f"next sync in {sync_status['next_flush_in']:.0f}s")
+    elif sync_status["github_configured"] is False:
+        st.warning("GitHub not configured, only local data and Excel backup are updated")
+    elif sync_status["last_sync"]:
+        st.success(f"All changes synced (last sync {datetime.fromisoformat(sync_status['last_sync']).strftime('%H:%M:%S')})")
@@ -0,0 +1,137 @@
+"""
+Opt-in cProfile of every Streamlit page run
+
+Set SPL_PROFILE=1 and each run of a page (the first render and every rerun
+after a widget interaction) is profiled. A page calls profile_page(__file__)
+right after its imports; when profiling is on, that executes the rest of the
+page under cProfile and stops the outer run, so the whole render is covered
+without re-indenting the page. Each run writes
+
+    <SPL_PROFILE_DIR>/<timestamp>-<page>.prof   pstats data for snakeviz/pstats
+    <SPL_PROFILE_DIR>/<timestamp>-<page>.json   duration, outcome, top functions
+
+and only the newest PROFILE_KEEP runs are kept. The page's top-level imports
+run before profiling starts; modules imported lazily show up in the first
+run that needs them.
+"""
+import cProfile
+import glob
+import json
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+import streamlit as st
+from core.storage import DATA_DIR
+
+PROFILE_ENABLED = os.environ.get("SPL_PROFILE", "") not in ("", "0")
+PROFILE_DIR = os.environ.get("SPL_PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_KEEP = int(os.environ.get("SPL_PROFILE_KEEP", "200"))
+# Functions listed in each run's summary, by cumulative time
+TOP_FUNCTIONS = 25
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Set while a page is executing under the profiler, so its nested
+# profile_page call lets it run instead of starting another profile
+_active = threading.local()
+
+
+def _function_name(func):
+    filename, line, name = func
+    if filename.startswith(ROOT):
+        filename = os.path.relpath(filename, ROOT)
+    return f"{filename}:{line}({name})" if line else name
+
+
+def _summary(page, started, seconds, outcome, profiler):
+    stats = pstats.Stats(profiler).sort_stats("cumulative")
+    top = []
+    for func in stats.fcn_list[:TOP_FUNCTIONS]:
+        primitive_calls, calls, own_time, cumulative_time, _ = stats.stats[func]
+        top.append({
+            "function": _function_name(func),
+            "calls": calls,
+            "own_seconds": own_time,
+            "cumulative_seconds": cumulative_time,
+        })
+    return {"page": page, "started": started, "seconds": seconds, "outcome": outcome, "top": top}
+
+
+def _write(page, started, seconds, outcome, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{started.replace(':', '').replace('-', '')}-{page}")
+    profiler.dump_stats(base + ".prof")
+    summary = _summary(page, started, seconds, outcome, profiler)
+    with open(base + ".json", "w") as f:
+        json.dump({**summary, "stats_file": os.path.basename(base + ".prof")}, f, indent=2)
+
+    # Timestamped names sort oldest first
+    for path in sorted(glob.glob(os.path.join(PROFILE_DIR, "*.json")))[:-PROFILE_KEEP or None]:
+        for stale in (path, path[:-len(".json")] + ".prof"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def profile_page(path):
+    """
+    Run the rest of a page under cProfile if SPL_PROFILE is set
+
+    Call right after the page's imports with the page's __file__. When
+    profiling is off, or the page is already running under the profiler,
+    this returns straight away and the page carries on as usual.
+
+    Args:
+        path: The page's script file
+    """
+    if not PROFILE_ENABLED or getattr(_active, "page", None):
+        return
+
+    page = os.path.splitext(os.path.basename(path))[0]
+    with open(path) as f:
+        code = compile(f.read(), path, "exec")
+
+    started = datetime.now().isoformat(timespec="microseconds")
+    profiler = cProfile.Profile()
+    outcome = "completed"
+    _active.page = page
+    start = time.perf_counter()
+    try:
+        namespace = {"__name__": "__main__", "__file__": path}
+        profiler.runctx(code, namespace, namespace)
+    except BaseException as e:
+        # st.rerun() and st.stop() end a run with an exception too
+        outcome = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _active.page = None
+        try:
+            _write(page, started, seconds, outcome, profiler)
+        except Exception:
+            pass
+    # The page has been rendered; skip the unprofiled copy of it
+    st.stop()
+
+
+def get_profiles(limit=20):
+    """
+    Summaries of the slowest profiled page runs
+
+    Args:
+        limit: Number of runs to return
+
+    Returns:
+        list: dicts with page, started, seconds, outcome, top functions and
+              stats_file, slowest first
+    """
+    profiles = []
+    for path in glob.glob(os.path.join(PROFILE_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda profile: profile["seconds"], reverse=True)
+    return profiles[:limit]